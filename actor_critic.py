@@ -0,0 +1,277 @@
+import math
+
+import numpy
+
+from tables import add_at, SparseTable
+
+
+class SoftmaxSampler(object):
+    """Cached softmax action distributions of a tabular policy.
+
+    Keeps the cumulated softmax probabilities of the states that have been
+    sampled, one row per state in the order they were first seen, so the
+    cache grows with the visited states rather than the table and is kept
+    in the policy's float precision (at least float32).  Sampling a batch
+    of states compares one random number per state with its row in a
+    single vectorized step.  Rows are computed lazily: refresh() only marks
+    cells whose preferences changed and sample() recomputes the stale rows
+    it is about to use, so neither a large policy nor a burst of updates
+    costs more than the visited states.
+
+    The cell -> row index is an int32 per cell for a dense policy and a
+    dict of the visited cells for a tables.SparseTable, like the table's
+    own.
+
+    :param policy: (paddle bins, ball bins, actions) preferences, read on
+                   demand; a numpy array or a tables.SparseTable
+    """
+
+    def __init__(self, policy, rng=None):
+        self.policy = policy
+        self.rng = numpy.random if rng is None else rng
+        self.num_actions = policy.shape[-1]
+        self.num_cells = policy.size // self.num_actions
+        self.cell_shape = policy.shape[:-1]
+        self.dtype = numpy.result_type(policy.dtype, numpy.float32)
+        if isinstance(policy, SparseTable):
+            self.index = {}
+        else:
+            self.index = numpy.full(self.num_cells, -1, dtype=numpy.int32)
+        self.table = numpy.empty((16, self.num_actions), dtype=self.dtype)
+        self.fresh = numpy.zeros(16, dtype=bool)
+        self.count = 0
+
+    def refresh_all(self):
+        self.fresh.fill(False)
+
+    def refresh(self, paddle, ball_y):
+        """Mark the given cells (indices or index arrays) as changed."""
+        rows = self.lookup(numpy.atleast_1d(numpy.ravel_multi_index((paddle, ball_y),
+                                                                    self.cell_shape)))
+        self.fresh[rows[rows >= 0]] = False
+
+    def lookup(self, cells):
+        # cache row of every cell, -1 if it has none yet
+        if isinstance(self.index, dict):
+            get = self.index.get
+            return numpy.array([get(cell, -1) for cell in cells.tolist()], dtype=int)
+        return self.index[cells]
+
+    def allocate(self, cells):
+        # give the cells without a row one, growing the cache if needed
+        cells = numpy.unique(cells)
+        count = self.count + len(cells)
+        if count > len(self.table):
+            capacity = max(count, 2 * len(self.table))
+            table = numpy.empty((capacity, self.num_actions), dtype=self.dtype)
+            table[:self.count] = self.table[:self.count]
+            fresh = numpy.zeros(capacity, dtype=bool)
+            fresh[:self.count] = self.fresh[:self.count]
+            self.table, self.fresh = table, fresh
+        rows = numpy.arange(self.count, count)
+        if isinstance(self.index, dict):
+            self.index.update(zip(cells.tolist(), rows.tolist()))
+        else:
+            self.index[cells] = rows
+        self.fresh[rows] = False
+        self.count = count
+
+    def compute(self, cells):
+        cells = numpy.unique(cells)
+        rows = self.lookup(cells)
+        if (rows < 0).any():
+            self.allocate(cells[rows < 0])
+            rows = self.lookup(cells)
+        index = numpy.unravel_index(cells, self.cell_shape)
+        preferences = numpy.asarray(self.policy[index], dtype=float).reshape(len(cells), -1)
+        # subtracting the max leaves the softmax unchanged and can't overflow
+        prop = numpy.exp(preferences - preferences.max(axis=1)[:, None])
+        cum_prop = numpy.cumsum(prop, axis=1)
+        cum_prop /= cum_prop[:, -1:]
+        self.table[rows] = cum_prop
+        self.fresh[rows] = True
+
+    def rows(self, cells):
+        # cache rows of the cells, (re)computing the missing or stale ones
+        rows = self.lookup(cells)
+        stale = (rows < 0) | ~self.fresh[rows]
+        if stale.any():
+            self.compute(cells[stale])
+            rows = self.lookup(cells)
+        return rows
+
+    def cumulated(self, state):
+        # cumulated probabilities of one (ball_y, paddle) state
+        cell = numpy.ravel_multi_index((state[1], state[0]), self.cell_shape)
+        row = self.rows(numpy.array([cell]))[0]
+        return self.table[row]
+
+    def sample(self, states):
+        """One action per (ball_y, paddle) state, drawn in one vectorized step."""
+        states = numpy.asarray(states).reshape(-1, 2)
+        cells = numpy.ravel_multi_index((states[:, 1], states[:, 0]), self.cell_shape)
+        rows = self.rows(cells) # may grow self.table
+        cum_prop = self.table[rows]
+        r = self.rng.rand(len(cells))
+        # first action whose cumulated probability is above r
+        actions = (cum_prop <= r[:, None]).sum(axis=1)
+        return numpy.minimum(actions, self.num_actions - 1)
+
+
+class EligibilityTraces(object):
+    """Sparse accumulating eligibility traces of a batch of episodes.
+
+    Instead of a trace per table cell, every episode keeps a ring buffer of
+    its last visits (cell and action); a visit age steps ago has the trace
+    (gamma * lambda) ** age.  The ring is just long enough for the oldest
+    trace to stay above the cutoff, so an update touches at most that many
+    cells per episode.
+
+    :param decay: gamma * lambda
+    :param cutoff: smallest trace that is still applied
+    """
+
+    def __init__(self, decay, cutoff=0.01):
+        self.decay = decay
+        self.length = 1
+        if decay > 0:
+            self.length = max(1, int(math.ceil(math.log(cutoff) / math.log(decay))))
+        self.weights = decay ** numpy.arange(self.length)
+        self.cells = None
+        self.valid = None
+        self.position = 0
+
+    def visit(self, paddle, ball_y, actions, learned):
+        # record one step of every episode; unlearned steps only age the traces
+        if self.cells is None or len(self.cells) != len(paddle):
+            self.cells = numpy.zeros((len(paddle), self.length, 3), dtype=int)
+            self.valid = numpy.zeros((len(paddle), self.length), dtype=bool)
+        self.position = (self.position + 1) % self.length
+        cells = self.cells[:, self.position]
+        cells[:, 0] = paddle
+        cells[:, 1] = ball_y
+        cells[:, 2] = actions
+        self.valid[:, self.position] = learned
+
+    def active(self):
+        """(episode, paddle, ball_y, action, trace) of all live entries."""
+        ages = (self.position - numpy.arange(self.length)) % self.length
+        episodes, slots = numpy.nonzero(self.valid)
+        cells = self.cells[episodes, slots]
+        return episodes, cells[:, 0], cells[:, 1], cells[:, 2], self.weights[ages[slots]]
+
+    def clear(self, episodes):
+        self.valid[episodes] = False
+
+
+class ActorCritic(object):
+    """Batched tabular actor-critic with the updates of td_pong_learn.
+
+    policy[paddle, ball_y, action] holds the action preferences (softmax
+    policy) and values[paddle, ball_y] the critic; states are
+    (ball_y, paddle) rows as returned by the environments.  Both arrays are
+    updated in place, so a Checkpointer can hold on to them; after changing
+    the policy from outside, call sampler.refresh_all().
+
+    A batch is treated like simultaneous transitions: every TD error is
+    computed from the values before the batch and the updates are summed
+    with numpy.add.at, so several transitions from the same state all
+    count.  Summing k errors computed from the same old value overshoots
+    (and diverges once alpha * k > 2), so the updates of a state seen k
+    times are scaled by (1 - (1 - alpha) ** k) / (alpha * k): the total
+    then equals k sequential updates towards the same targets.  With one
+    transition per batch this is exactly the old per-step loop.
+
+    With trace_decay (lambda) above 0 both critic and actor learn with
+    TD(lambda): the TD error of every episode is also applied to the cells
+    it visited recently, weighted by their EligibilityTraces.  The damping
+    for repeated states uses the cells visited in this step.
+
+    :param policy: (paddle bins, ball bins, actions) array
+    :param values: (paddle bins, ball bins) array
+    :param trace_decay: lambda, 0 for one-step TD
+    :param trace_cutoff: traces below this are dropped
+    """
+
+    def __init__(self, policy, values, alpha=0.1, beta=0.01, gamma=0.5, rng=None,
+                 trace_decay=0.0, trace_cutoff=0.01):
+        self.policy = policy
+        self.values = values
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.sampler = SoftmaxSampler(policy, rng)
+        self.traces = None
+        if trace_decay > 0:
+            self.traces = EligibilityTraces(gamma * trace_decay, trace_cutoff)
+
+    def pick_actions(self, states):
+        """Sample one action per state from the softmax of its preferences."""
+        return self.sampler.sample(states)
+
+    def errors(self, last_states, rewards, states):
+        # td_pong_learn.critic for a batch
+        values = self.values
+        return (rewards - values[last_states[:, 1], last_states[:, 0]] +
+                self.gamma * values[states[:, 1], states[:, 0]])
+
+    def update(self, last_states, actions, rewards, states, dones=None):
+        """Learn from a batch of (last_state, action, reward, state) transitions.
+
+        As in td_pong_learn, only transitions with a reward or a change of
+        state are learned from.  Row i of the batch must always come from
+        the same episode stream when traces are on; dones (a boolean mask)
+        ends the traces of the finished episodes.  Returns the TD errors of
+        all transitions.
+        """
+        last_states = numpy.asarray(last_states).reshape(-1, 2)
+        states = numpy.asarray(states).reshape(-1, 2)
+        actions = numpy.asarray(actions).ravel()
+        rewards = numpy.asarray(rewards, dtype=float).ravel()
+
+        if self.traces is None:
+            return self.backup(last_states, actions, rewards, states)
+
+        errors = self.errors(last_states, rewards, states)
+        learn = (rewards != 0) | (states != last_states).any(axis=1)
+        steps = numpy.zeros(len(errors))
+        steps[learn] = errors[learn] * self.duplicate_scale(last_states[learn, 1],
+                                                            last_states[learn, 0])
+        self.traces.visit(last_states[:, 1], last_states[:, 0], actions, learn)
+        episodes, paddle, ball_y, traced_actions, traces = self.traces.active()
+        if dones is not None:
+            self.traces.clear(dones)
+        self.apply(paddle, ball_y, traced_actions, steps[episodes] * traces)
+        return errors
+
+    def backup(self, last_states, actions, rewards, states, actor=True):
+        """One-step update of a batch of transitions, never traced.
+
+        This is update() without traces; simulated transitions (see
+        planning.PrioritizedSweeping) go through here, with actor=False
+        for a critic-only update.
+        """
+        errors = self.errors(last_states, rewards, states)
+        learn = (rewards != 0) | (states != last_states).any(axis=1)
+        paddle = last_states[learn, 1]
+        ball_y = last_states[learn, 0]
+        step = errors[learn] * self.duplicate_scale(paddle, ball_y)
+        self.apply(paddle, ball_y, actions[learn] if actor else None, step)
+        return errors
+
+    def apply(self, paddle, ball_y, actions, step):
+        add_at(self.values, (paddle, ball_y), self.alpha * step)
+        if actions is not None:
+            add_at(self.policy, (paddle, ball_y, actions), self.beta * step)
+            self.sampler.refresh(paddle, ball_y)
+
+    def duplicate_scale(self, paddle, ball_y):
+        # per transition: 1 for a state seen once in the batch, less for
+        # states seen k times (see the class docstring)
+        if len(paddle) < 2:
+            return numpy.ones(len(paddle))
+        cells = numpy.ravel_multi_index((paddle, ball_y), self.values.shape)
+        # counted over the batch only, a large or sparse table costs nothing
+        _, inverse, counts = numpy.unique(cells, return_inverse=True, return_counts=True)
+        counts = counts[inverse].astype(float)
+        return (1 - (1 - self.alpha) ** counts) / (self.alpha * counts)
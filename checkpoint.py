@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+import numpy
+
+from tables import SparseTable
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def load_array(path, legacy_path=None, mmap_mode=None):
+    """Load a checkpointed array, migrating an old JSON dump if needed.
+
+    :param path: .npy file written by Checkpointer (a SparseTable is
+                 stored as npz under the same name)
+    :param legacy_path: JSON file (nested lists) used if path doesn't exist
+    :param mmap_mode: passed to numpy.load for dense arrays; 'c' maps the
+                      file copy-on-write, so even large tables load at once
+    :returns: the array, or None if neither file exists
+    """
+    if os.path.exists(path):
+        data = numpy.load(path, mmap_mode=mmap_mode)
+        if isinstance(data, numpy.lib.npyio.NpzFile):
+            with data:
+                return SparseTable.load(data)
+        return data
+    if legacy_path is not None and os.path.exists(legacy_path):
+        with open(legacy_path) as f:
+            return numpy.array(json.loads(f.read()))
+    return None
+
+
+def write_atomic(path, array):
+    # readers see either the old or the new file, never a partial one
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        if hasattr(array, 'save'):
+            # SparseTable and other objects that write their own format
+            array.save(f)
+        else:
+            numpy.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    if hasattr(os, 'replace'):
+        os.replace(tmp, path)
+    else:
+        os.rename(tmp, path)
+
+
+class Checkpointer(object):
+    """Saves numpy arrays to .npy files from a background writer thread.
+
+    maybe_save() is cheap enough to call on every iteration: it only copies
+    the arrays when `every` iterations or `seconds` of wall-clock time have
+    passed since the last checkpoint, and the writer thread does the file
+    work.  If the writer falls behind, only the newest copy is written.
+    A failed write is raised again by the next save(), flush() or close().
+
+    :param arrays: dict of name -> array to save (updated in place by the caller)
+    :param paths: dict of name -> .npy path
+    :param every: checkpoint every this many iterations (None: no limit)
+    :param seconds: checkpoint at least this often in seconds (None: no limit)
+    """
+
+    def __init__(self, arrays, paths, every=None, seconds=None):
+        self.arrays = arrays
+        self.paths = paths
+        self.every = every
+        self.seconds = seconds
+        self.last_iteration = 0
+        self.last_time = timer()
+
+        self.condition = threading.Condition()
+        self.pending = None
+        self.writing = False
+        self.closed = False
+        self.error = None # exception of a failed write, not yet raised
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def maybe_save(self, iteration):
+        if self.every is not None and iteration - self.last_iteration >= self.every:
+            self.save(iteration)
+        elif self.seconds is not None and timer() - self.last_time >= self.seconds:
+            self.save(iteration)
+
+    def save(self, iteration=None):
+        # copy now, write later
+        self.check()
+        copies = dict((name, array.copy()) for name, array in self.arrays.items())
+        if iteration is not None:
+            self.last_iteration = iteration
+        self.last_time = timer()
+        self.condition.acquire()
+        self.pending = copies
+        self.condition.notify_all()
+        self.condition.release()
+
+    def run(self):
+        while True:
+            self.condition.acquire()
+            while self.pending is None and not self.closed:
+                self.condition.wait()
+            copies, self.pending = self.pending, None
+            self.writing = copies is not None
+            self.condition.release()
+            if copies is None:
+                return
+            try:
+                for name, array in copies.items():
+                    write_atomic(self.paths[name], array)
+            except Exception as e:
+                self.error = e
+            finally:
+                # waiters must wake up even if the write failed
+                self.condition.acquire()
+                self.writing = False
+                self.condition.notify_all()
+                self.condition.release()
+
+    def check(self):
+        # raise the error of a failed write (once)
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def flush(self):
+        # wait until everything saved so far is on disk
+        self.condition.acquire()
+        while self.pending is not None or self.writing:
+            self.condition.wait()
+        self.condition.release()
+        self.check()
+
+    def close(self):
+        # a final checkpoint, then stop the writer (also if a write failed)
+        try:
+            self.save()
+            self.flush()
+        finally:
+            self.condition.acquire()
+            self.closed = True
+            self.condition.notify_all()
+            self.condition.release()
+            self.thread.join()
@@ -0,0 +1,199 @@
+import socket
+import struct
+import threading
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import numpy
+
+# Every request starts with a header: opcode, number of environments n and
+# the number of steps to repeat the actions for.  It is followed by n
+# uint16 environment indices and, for STEP, n uint8 action indices.
+#   INFO  -> uint16 number of environments, uint16 x 2 world dim, uint8 actions
+#   RESET -> n x 2 int32 observations
+#   STEP  -> n x 2 int32 observations, n float32 rewards, n uint8 done flags
+# Rewards are summed and done flags or'ed over the repeated steps.  Every
+# reply is preceded by a status (OK or ERROR) and a message length; an
+# ERROR carries a utf-8 message instead of the reply.  After an unknown
+# opcode the server closes the connection, as it can't find the next request.
+REQUEST = struct.Struct('<BHH')
+STATUS = struct.Struct('<BH')
+OK, ERROR = range(2)
+INFO_REPLY = struct.Struct('<HHHB')
+INFO, RESET, STEP = range(3)
+NUM_ACTIONS = 3
+
+
+def recv_exactly(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("connection closed")
+        data += chunk
+    return data
+
+
+class EnvRequestHandler(socketserver.BaseRequestHandler):
+    # one connection: requests are answered in order until the client leaves
+
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                op, n, repeat = REQUEST.unpack(recv_exactly(sock, REQUEST.size))
+                indices = numpy.frombuffer(recv_exactly(sock, 2 * n), dtype='<u2')
+                if op not in (INFO, RESET, STEP):
+                    self.send_error("unknown opcode %d" % op)
+                    return
+                if op == STEP:
+                    actions = numpy.frombuffer(recv_exactly(sock, n), dtype=numpy.uint8)
+                try:
+                    if op == STEP:
+                        reply = self.server.step(indices, actions, repeat)
+                    elif op == RESET:
+                        reply = self.server.reset(indices)
+                    else:
+                        reply = self.server.info()
+                except Exception as e:
+                    # the request was read completely, the connection stays usable
+                    self.send_error("%s: %s" % (type(e).__name__, e))
+                    continue
+                sock.sendall(STATUS.pack(OK, 0) + reply)
+        except EOFError:
+            pass
+
+    def send_error(self, message):
+        message = message.encode('utf-8')[:0xffff]
+        self.request.sendall(STATUS.pack(ERROR, len(message)) + message)
+
+
+class EnvServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Serves the members of a VectorEnv to agents in other processes.
+
+    Each client addresses the environments it plays by index, so several
+    clients can share one pool of games.  Requests for different
+    environments run concurrently (the two players of a lockstep game may
+    be stepped by different clients); an environment is locked while a
+    request steps or resets it.  Run the server with start() (a daemon
+    thread) or serve_forever().
+
+    :param envs: the VectorEnv to serve
+    :param address: (host, port) to listen on, port 0 picks a free one
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, envs, address=('127.0.0.1', 0)):
+        socketserver.TCPServer.__init__(self, address, EnvRequestHandler)
+        self.envs = envs
+        self.locks = [threading.Lock() for _ in range(envs.num_envs)]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def info(self):
+        dim = self.envs.envs[0].world_dim
+        return INFO_REPLY.pack(self.envs.num_envs, dim[0], dim[1], NUM_ACTIONS)
+
+    def reset(self, indices):
+        observations = numpy.empty((len(indices), 2), dtype='<i4')
+        locks = self.acquire(indices)
+        try:
+            for j, i in enumerate(indices):
+                observations[j] = self.envs.envs[i].reset()
+        finally:
+            self.release(locks)
+        return observations.tobytes()
+
+    def step(self, indices, actions, repeat):
+        n = len(indices)
+        observations = numpy.empty((n, 2), dtype='<i4')
+        rewards = numpy.empty(n, dtype='<f4')
+        dones = numpy.empty(n, dtype=numpy.uint8)
+        total = numpy.zeros(n, dtype='<f4')
+        done = numpy.zeros(n, dtype=numpy.uint8)
+        locks = self.acquire(indices)
+        try:
+            for _ in range(max(repeat, 1)):
+                self.envs.step_members(indices, actions, observations, rewards, dones)
+                total += rewards
+                done |= dones
+        finally:
+            self.release(locks)
+        return observations.tobytes() + total.tobytes() + done.tobytes()
+
+    def acquire(self, indices):
+        # always in index order, so overlapping requests can't deadlock
+        locks = [self.locks[i] for i in sorted(set(indices))]
+        for lock in locks:
+            lock.acquire()
+        return locks
+
+    def release(self, locks):
+        for lock in locks:
+            lock.release()
+
+
+class EnvClient(object):
+    """Agent side of an EnvServer connection.
+
+    :param address: (host, port) of the server
+    """
+
+    def __init__(self, address):
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        num_envs, dim0, dim1, num_actions = INFO_REPLY.unpack(self.request(INFO, [], None, 1,
+                                                                           INFO_REPLY.size))
+        self.num_envs = num_envs
+        self.world_dim = [dim0, dim1]
+        self.num_actions = num_actions
+
+    def request(self, op, indices, actions, repeat, reply_size):
+        indices = numpy.asarray(indices, dtype='<u2')
+        message = REQUEST.pack(op, len(indices), repeat) + indices.tobytes()
+        if actions is not None:
+            message += numpy.asarray(actions, dtype=numpy.uint8).tobytes()
+        self.sock.sendall(message)
+        status, length = STATUS.unpack(recv_exactly(self.sock, STATUS.size))
+        if status != OK:
+            raise RuntimeError("env server: " +
+                               recv_exactly(self.sock, length).decode('utf-8'))
+        return recv_exactly(self.sock, reply_size)
+
+    def reset(self, indices=None):
+        """(n, 2) observations of the (re)started environments."""
+        if indices is None:
+            indices = range(self.num_envs)
+        indices = list(indices)
+        reply = self.request(RESET, indices, None, 1, 8 * len(indices))
+        return numpy.frombuffer(reply, dtype='<i4').reshape(-1, 2)
+
+    def step(self, actions, indices=None, repeat=1):
+        """Step the environments in one round-trip.
+
+        :param actions: one action index per environment
+        :param indices: environments to step (all if None)
+        :param repeat: number of steps to hold the actions for
+        :returns: (n, 2) observations, (n,) rewards, (n,) done flags
+        """
+        if indices is None:
+            indices = range(self.num_envs)
+        indices = list(indices)
+        n = len(indices)
+        reply = self.request(STEP, indices, actions, repeat, 13 * n)
+        observations = numpy.frombuffer(reply, dtype='<i4', count=2 * n).reshape(n, 2)
+        rewards = numpy.frombuffer(reply, dtype='<f4', count=n, offset=8 * n)
+        dones = numpy.frombuffer(reply, dtype=numpy.uint8, count=n, offset=12 * n)
+        return observations, rewards, dones.astype(bool)
+
+    def close(self):
+        self.sock.close()
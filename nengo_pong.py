@@ -7,7 +7,7 @@ import numpy as np
 import nengo
 from nengo.utils.distributions import Uniform
 
-from pong_environment_play import PongGame
+from pong_environment_play import PongProcess
 import rl_pongplayer
 
 class DecoderPongPlayer(nengo.Network):
@@ -110,7 +110,8 @@ rng.seed(SEED)
 
 nengo.log()
 
-pong_game = PongGame(["computer", "computer"], seed=SEED)
+# run the game in its own process so it doesn't compete with the simulator for the GIL
+pong_game = PongProcess(["computer", "computer"], seed=SEED)
 
 l_rate = 5e-5
 discount = 0.97
@@ -0,0 +1,106 @@
+import multiprocessing
+import sys
+import time
+
+import numpy
+
+import pong_environment_training as env
+from actor_critic import ActorCritic
+from planning import PrioritizedSweeping
+from pong_shared import new_array
+
+# a worker reloads the cached softmax table (other workers' updates) and
+# reports its progress every this many iterations
+SYNC_EVERY = 100
+REPORT_SECONDS = 0.5
+
+
+class SharedTables(object):
+    """Policy and value tables in multiprocessing shared memory.
+
+    policy and values are numpy views of the shared buffers; passed to a
+    child process only the buffers travel, and the child builds its own
+    views of the same memory.
+    """
+
+    def __init__(self, policy, values):
+        self.shapes = (policy.shape, values.shape)
+        self.buffers = (new_array('d', policy.size, shared=True),
+                        new_array('d', values.size, shared=True))
+        self.map()
+        self.policy[...] = policy
+        self.values[...] = values
+
+    def map(self):
+        self.policy, self.values = [numpy.frombuffer(buf, dtype=float).reshape(shape)
+                                    for buf, shape in zip(self.buffers, self.shapes)]
+
+    def __getstate__(self):
+        return {'shapes': self.shapes, 'buffers': self.buffers}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.map()
+
+
+def worker(tables, progress, index, iterations, num_worlds, params, planning_steps, seed):
+    # one process: its own grid worlds, learner and planner model, the
+    # tables are shared and updated without any lock (Hogwild)
+    rng = numpy.random.RandomState(seed)
+    learner = ActorCritic(tables.policy, tables.values, rng=rng, **params)
+    planner = PrioritizedSweeping(learner) if planning_steps else None
+    worlds = env.GridWorld(num_worlds, seed=rng.randint(1 << 30))
+    states = worlds.getState().copy()
+    last_states = numpy.empty_like(states)
+    for i in range(1, iterations + 1):
+        directions = learner.pick_actions(states)
+        last_states[:] = states
+        new_states, outcomes = worlds.move(directions)
+        states[:] = new_states
+        errors = learner.update(last_states, directions, outcomes, states)
+        if planner is not None:
+            planner.observe(last_states, directions, outcomes, states, errors)
+            planner.plan(planning_steps)
+        if i % SYNC_EVERY == 0:
+            learner.sampler.refresh_all()
+            progress[index] = i
+    progress[index] = iterations
+
+
+def train_parallel(tables, iterations, num_workers, num_worlds=1, params=None,
+                   checkpoints=None, planning_steps=0, report=sys.stdout):
+    """Train on SharedTables with num_workers processes.
+
+    The iterations are split between the workers.  The calling process
+    only reports progress and hands the tables to checkpoints (a
+    Checkpointer holding tables.policy and tables.values).
+
+    :param params: keyword arguments for ActorCritic (alpha, beta, ...)
+    :param planning_steps: per-worker PrioritizedSweeping budget per iteration
+    """
+    params = params or {}
+    progress = new_array('L', num_workers, shared=True)
+    share = -(-iterations // num_workers)
+    workers = []
+    for index in range(num_workers):
+        count = max(0, min(share, iterations - index * share))
+        workers.append(multiprocessing.Process(
+            target=worker, args=(tables, progress, index, count, num_worlds, params,
+                                 planning_steps, numpy.random.randint(1 << 30))))
+    for process in workers:
+        process.start()
+
+    while any(process.is_alive() for process in workers):
+        time.sleep(REPORT_SECONDS)
+        done = sum(progress)
+        report.write(str(float(done) / iterations) + "\r")
+        if checkpoints is not None:
+            checkpoints.maybe_save(done)
+
+    for process in workers:
+        process.join()
+    # a crashed worker leaves the tables half trained, don't let the caller
+    # checkpoint and export them as if training had finished
+    failed = [process.exitcode for process in workers if process.exitcode != 0]
+    if failed:
+        raise RuntimeError("%d training worker(s) failed, exit codes %s" % (len(failed), failed))
@@ -0,0 +1,96 @@
+import heapq
+
+import numpy
+
+
+class PrioritizedSweeping(object):
+    """Dyna-style planner for an ActorCritic on the grid world.
+
+    Every observed transition is stored in the model: the next cell and
+    reward of each (cell, action), the latest observation winning (the grid
+    world is deterministic up to the beam after a catch).  Cells whose TD
+    error exceeds the threshold go into a priority queue; plan() replays
+    the modelled actions of the most urgent cells through
+    ActorCritic.backup and queues their predecessors, whose targets have
+    just changed.
+
+    Planning only updates the critic.  Replayed actor updates pile up on
+    the catch cells, whose model loops back onto itself with +600, and
+    make their preferences explode; the actor learns from the sharper TD
+    errors of the real transitions instead.
+
+    :param learner: the ActorCritic to plan for
+    :param threshold: smallest absolute TD error worth a backup
+    """
+
+    def __init__(self, learner, threshold=1.0):
+        self.learner = learner
+        self.threshold = threshold
+        self.shape = learner.values.shape
+        # all hashed by flat cell number, so the planner only holds the
+        # visited cells (like a tables.SparseTable) and finds predecessors
+        # without scanning the model
+        self.model = {} # cell -> {action: (next cell, reward)}
+        self.predecessors = {} # cell -> set of (cell, action) leading to it
+        # queued priority of every queued cell; heap entries with another
+        # priority are stale and skipped
+        self.priorities = {}
+        self.queue = []
+
+    def cells(self, states):
+        return numpy.ravel_multi_index((states[:, 1], states[:, 0]), self.shape)
+
+    def states(self, cells):
+        paddle, ball_y = numpy.unravel_index(cells, self.shape)
+        return numpy.column_stack((ball_y, paddle))
+
+    def observe(self, last_states, actions, rewards, states, errors):
+        """Record a batch of real transitions and the TD errors update() returned."""
+        last_cells = self.cells(numpy.asarray(last_states).reshape(-1, 2))
+        next_cells = self.cells(numpy.asarray(states).reshape(-1, 2))
+        model, predecessors = self.model, self.predecessors
+        for cell, action, next_cell, reward in zip(last_cells.tolist(),
+                                                   numpy.asarray(actions).ravel().tolist(),
+                                                   next_cells.tolist(),
+                                                   numpy.asarray(rewards).ravel().tolist()):
+            outcomes = model.setdefault(cell, {})
+            old = outcomes.get(action)
+            if old is not None and old[0] != next_cell:
+                predecessors[old[0]].discard((cell, action))
+            outcomes[action] = (next_cell, reward)
+            predecessors.setdefault(next_cell, set()).add((cell, action))
+        self.push(last_cells.tolist(), numpy.abs(errors).tolist())
+
+    def push(self, cells, priorities):
+        queued = self.priorities
+        for cell, priority in zip(cells, priorities):
+            if priority > self.threshold and priority > queued.get(cell, 0):
+                queued[cell] = priority
+                heapq.heappush(self.queue, (-priority, cell))
+
+    def plan(self, budget):
+        """Run up to budget simulated backups; returns how many were run."""
+        done = 0
+        while self.queue and done < budget:
+            priority, cell = heapq.heappop(self.queue)
+            if -priority != self.priorities.get(cell):
+                continue
+            del self.priorities[cell]
+
+            outcomes = self.model[cell]
+            actions = numpy.array(list(outcomes))
+            next_cells, rewards = zip(*[outcomes[action] for action in outcomes])
+            self.learner.backup(self.states(numpy.full(len(actions), cell)), actions,
+                                numpy.array(rewards), self.states(numpy.array(next_cells)),
+                                actor=False)
+            done += len(actions)
+
+            leading = self.predecessors.get(cell)
+            if leading:
+                predecessors = [predecessor for predecessor, _ in leading]
+                rewards = [self.model[predecessor][action][1] for predecessor, action in leading]
+                errors = self.learner.errors(self.states(numpy.array(predecessors)),
+                                             numpy.array(rewards),
+                                             self.states(numpy.full(len(predecessors), cell)))
+                self.push(predecessors, numpy.abs(errors).tolist())
+        return done
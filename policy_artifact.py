@@ -0,0 +1,114 @@
+import sys
+import zlib
+
+import numpy
+
+from checkpoint import load_array, write_atomic
+from tables import SparseTable
+
+MAGIC = b"PONGPOL1"
+HEADER_DTYPE = numpy.dtype([('magic', 'S8'), ('paddle_bins', '<u4'), ('ball_bins', '<u4'),
+                            ('num_actions', '<u4'), ('source_checksum', '<u4')])
+# cumulated probabilities are stored as uint16, the last action at QUANT
+QUANT = 65535
+EXPORT_ROWS = 1 << 16
+
+
+def compile_policy(policy):
+    """(greedy, cumulated) arrays of a policy table.
+
+    greedy[paddle, ball_y] is the int8 action with the highest preference,
+    cumulated[paddle, ball_y] the softmax cumulated probabilities as uint16
+    out of QUANT.
+    """
+    if isinstance(policy, SparseTable):
+        policy = policy.to_dense()
+    shape = policy.shape[:-1]
+    rows = numpy.asarray(policy).reshape(-1, policy.shape[-1])
+    greedy = numpy.empty(len(rows), dtype=numpy.int8)
+    cumulated = numpy.empty(rows.shape, dtype='<u2')
+    for start in range(0, len(rows), EXPORT_ROWS):
+        chunk = numpy.asarray(rows[start:start + EXPORT_ROWS], dtype=float)
+        greedy[start:start + EXPORT_ROWS] = chunk.argmax(axis=1)
+        prop = numpy.exp(chunk - chunk.max(axis=1)[:, None])
+        cum_prop = numpy.cumsum(prop, axis=1)
+        cum_prop *= QUANT / cum_prop[:, -1:]
+        cum_prop[:, -1] = QUANT
+        cumulated[start:start + EXPORT_ROWS] = numpy.round(cum_prop)
+    return greedy.reshape(shape), cumulated.reshape(policy.shape)
+
+
+def policy_checksum(policy):
+    """CRC32 of a policy table's contents, stored in the artifact header.
+
+    A player compares it with the checksum of the table it loaded to tell
+    whether the artifact was compiled from that table or is stale.
+    """
+    if isinstance(policy, SparseTable):
+        policy = policy.to_dense()
+    data = numpy.ascontiguousarray(policy)
+    return zlib.crc32(data.view(numpy.uint8).ravel()) & 0xffffffff
+
+
+class _Artifact(object):
+    # written by write_atomic: header, greedy actions, cumulated probabilities
+    def __init__(self, policy):
+        self.greedy, self.cumulated = compile_policy(policy)
+        self.source_checksum = policy_checksum(policy)
+
+    def save(self, f):
+        header = numpy.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['paddle_bins'], header['ball_bins'], header['num_actions'] = self.cumulated.shape
+        header['source_checksum'] = self.source_checksum
+        f.write(header.tobytes())
+        f.write(self.greedy.tobytes())
+        f.write(self.cumulated.tobytes())
+
+
+def export_policy(policy, path):
+    """Compile a policy table into the binary artifact read by CompiledPolicy."""
+    write_atomic(path, _Artifact(policy))
+
+
+class CompiledPolicy(object):
+    """Memory-mapped policy artifact written by export_policy.
+
+    Opening it only maps the file; each decision reads one row.  States
+    are (ball_y, paddle) as returned by the environments.  source_checksum
+    is the policy_checksum of the table it was compiled from.
+    """
+
+    def __init__(self, path):
+        header = numpy.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != MAGIC:
+            raise ValueError("%s is not a policy artifact" % path)
+        shape = (int(header['paddle_bins'][0]), int(header['ball_bins'][0]))
+        num_actions = int(header['num_actions'][0])
+        offset = HEADER_DTYPE.itemsize
+        self.greedy_actions = numpy.memmap(path, dtype=numpy.int8, mode='r',
+                                           offset=offset, shape=shape)
+        offset += self.greedy_actions.nbytes
+        self.cumulated = numpy.memmap(path, dtype='<u2', mode='r', offset=offset,
+                                      shape=shape + (num_actions,))
+        self.shape = shape
+        self.num_actions = num_actions
+        self.source_checksum = int(header['source_checksum'][0])
+
+    def compiled_from(self, policy):
+        # whether the artifact holds exactly this policy table
+        return (self.cumulated.shape == policy.shape and
+                self.source_checksum == policy_checksum(policy))
+
+    def greedy(self, state):
+        return int(self.greedy_actions[state[1], state[0]])
+
+    def sample(self, state):
+        # first action whose cumulated probability is above r
+        r = numpy.random.randint(QUANT)
+        return int((self.cumulated[state[1], state[0]] <= r).sum())
+
+
+if __name__ == "__main__":
+    # python policy_artifact.py pong_policy.npy pong_policy.bin
+    export_policy(load_array(sys.argv[1]), sys.argv[2])
@@ -12,39 +12,350 @@
 # along with this software. If not, see
 # <http://creativecommons.org/publicdomain/zero/1.0/>.
 
-import sge
-import Queue
+try:
+    import sge
+except ImportError:
+    # only the windowed backend needs sge, headless games run without it
+    sge = None
 import threading
+import numpy
 import numpy.random as random
+from pong_shared import timer, LOCKSTEP_GAME_WAIT, LOCKSTEP_AGENT_WAIT
+from pong_constants import (PADDLE_SPEED, COMPUTER_PADDLE_SPEED, PADDLE_VERTICAL_FORCE,
+                            BALL_START_SPEED, BALL_ACCELERATION, BALL_MAX_SPEED,
+                            PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_OFFSET, BALL_SIZE,
+                            WALL_DAMPING)
 
-PADDLE_SPEED = 2
-COMPUTER_PADDLE_SPEED = 2
-PADDLE_VERTICAL_FORCE = 1 / 12
-BALL_START_SPEED = 2
-BALL_ACCELERATION = 0.1
-BALL_MAX_SPEED = 15
 SIM_STEP = 0.001
+UNCAPPED_FPS = 100000
+NEVER = 1 << 30
+HEADLESS_FRAME_TIME = 1000.0 / 120
+
+
+
+class Match(object):
+    # Everything that belongs to one game: its objects, hit/miss counters
+    # and serve RNG.  Each game gets its own Match, so several games can
+    # live in one interpreter without sharing state.
+
+    def __init__(self, seed=None, hits=None, misses=None, width=640, height=480):
+        self.width = width
+        self.height = height
+        self.rng = random.RandomState(seed)
+
+        self.players = [None, None]
+        self.ball = None
+        self.hud_sprite = None
+        self.lockstep = None
+        self.telemetry = None
+        self.event_driven = False
+        self.game_in_progress = True
+        self.sim_time = 0.0
+        self.frames = 0
+
+        # the counters may be owned by the caller, e.g. in shared memory
+        self.hits = [0, 0] if hits is None else hits
+        self.misses = [0, 0] if misses is None else misses
+
+    def create_objects(self, players, actions, rewards, state):
+        for i in range(2):
+            if players[i] == "human":
+                self.players[i] = Player(self, i)
+            elif players[i] == "perfect":
+                self.players[i] = PerfectPlayer(self, i)
+            else:
+                self.players[i] = ComputerPlayer(self, actions[i], i)
+        self.ball = Ball(self, rewards, state)
+        self.ball.event_create()
+
+    def step(self, time_passed):
+        if self.telemetry is not None:
+            self.telemetry.frame()
+        self.sync()
+        self.simulate(time_passed)
+
+    def advance(self, time_passed):
+        # Event-driven step: jump over all frames in which nothing but
+        # straight-line motion can happen, then simulate the frame with the
+        # next wall bounce, paddle contact or score as usual.  Matches
+        # frame-by-frame stepping with held directions up to rounding (n * v
+        # instead of n additions of v).
+        if self.telemetry is not None:
+            self.telemetry.frame()
+        self.sync()
+        frames = self.frames_to_event()
+        if frames > 0:
+            self.coast(frames)
+        self.simulate(time_passed)
+        return frames + 1
+
+    def sync(self):
+        if self.lockstep is not None:
+            # the state published here is the outcome of the previous frame
+            self.ball.publish_state()
+            self.lockstep.next_frame()
+
+    def simulate(self, time_passed):
+        # One frame, in the order sge processes it: step events, movement,
+        # then collision events.
+        self.frames += 1
+        objects = self.players + [self.ball]
+        for obj in objects:
+            obj.event_step(time_passed)
+        for obj in objects:
+            obj.x += obj.xvelocity
+            obj.y += obj.yvelocity
+        for player in self.players:
+            if self.ball.collides(player):
+                self.ball.event_collision(player)
+
+    def frames_to_event(self):
+        # Number of frames that can be skipped: the next frame must not start
+        # with the ball out of the window or past a wall (scoring, bouncing)
+        # and must not end with the ball level with a paddle (collision).
+        ball = self.ball
+        x, y = ball.x, ball.y
+        xvelocity, yvelocity = ball.xvelocity, ball.yvelocity
+        if (ball.bbox_top < 0 or ball.bbox_bottom > self.height or
+                ball.bbox_right < 0 or ball.bbox_left > self.width):
+            return 0
+
+        frames = min(first_frame_past(y, yvelocity, ball.half_height,
+                                      self.height - ball.half_height),
+                     first_frame_past(x, xvelocity, -ball.half_width,
+                                      self.width + ball.half_width))
+        for player in self.players:
+            reach = ball.half_width + player.half_width
+            if abs(x - player.x) < reach:
+                return 0
+            if (player.x - x) * xvelocity > 0:
+                # approaching: skip up to the frame before the ball is level
+                contact = first_frame_past(x, xvelocity, player.x + reach,
+                                           player.x - reach)
+                frames = min(frames, contact - 1)
+        return frames
+
+    def coast(self, frames):
+        # Advance by frames in which nothing collides: the ball moves in a
+        # straight line and the paddles move as they would frame by frame
+        self.frames += frames
+        ball = self.ball
+        ball.x += frames * ball.xvelocity
+        ball.y += frames * ball.yvelocity
+        for player in self.players:
+            player.coast(frames)
+
+    def end(self):
+        self.game_in_progress = False
+        if self.lockstep is not None:
+            self.lockstep.close()
+
+
+def first_frame_past(position, velocity, low, high):
+    # first frame n >= 1 after which position + n * velocity is below low
+    # (moving down) or above high (moving up); a very large number if never
+    if velocity > 0:
+        bound, sign = high, 1
+    elif velocity < 0:
+        bound, sign = low, -1
+    else:
+        return NEVER
+    n = max(1, int((bound - position) / velocity) + 1)
+    # settle rounding so the result agrees with the comparisons themselves
+    while n > 1 and (position + (n - 1) * velocity - bound) * sign > 0:
+        n -= 1
+    while (position + n * velocity - bound) * sign <= 0:
+        n += 1
+    return n
+
+
+def predict_intercept(x, y, xvelocity, yvelocity, width=640, height=480):
+    """Predict where and when the ball gets level with the paddle it moves to.
+
+    Follows Ball.event_step frame by frame in closed form: straight-line
+    motion between bounces, the ball put back against the wall and its
+    vertical speed damped at each bounce.  Takes scalars or NumPy arrays.
+
+    :returns: (frames, y, player) -- the number of frames until the ball is
+              in the paddle's x range (0 if it already is or has passed it),
+              the ball y at that frame and the paddle (0 or 1) it moves to
+    """
+    x, y, xvelocity, yvelocity = numpy.broadcast_arrays(
+        *[numpy.array(v, dtype=float) for v in (x, y, xvelocity, yvelocity)])
+    y = y.copy()
+    yvelocity = yvelocity.copy()
+    player = (xvelocity > 0).astype(int)
+
+    reach = (BALL_SIZE + PADDLE_WIDTH) / 2
+    plane = numpy.where(player == 1, width - PADDLE_OFFSET - reach, PADDLE_OFFSET + reach)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        frames = numpy.floor((plane - x) / xvelocity) + 1
+    remaining = numpy.maximum(numpy.nan_to_num(frames), 0).astype(int)
+    frames = remaining.copy()
+
+    top = BALL_SIZE / 2
+    bottom = height - BALL_SIZE / 2
+    moving = remaining > 0
+    while moving.any():
+        # a ball past a wall is put back and bounces at the start of the frame
+        below = moving & (y > bottom)
+        above = moving & (y < top)
+        y[below] = bottom
+        y[above] = top
+        yvelocity[below] = -numpy.abs(yvelocity[below]) * WALL_DAMPING
+        yvelocity[above] = numpy.abs(yvelocity[above]) * WALL_DAMPING
+
+        # fly straight until past the next wall or out of frames
+        wall = numpy.where(yvelocity > 0, bottom, top)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            to_wall = numpy.floor((wall - y) / yvelocity) + 1
+        to_wall = numpy.where(numpy.isfinite(to_wall) & (to_wall > 0), to_wall, NEVER)
+        span = numpy.where(moving, numpy.minimum(to_wall, remaining), 0).astype(int)
+        y += span * yvelocity
+        remaining -= span
+        moving = remaining > 0
+
+    if frames.ndim == 0:
+        return int(frames), float(y), int(player)
+    return frames, y, player
+
+
+def intercept_distance(x, y, xvelocity, yvelocity, paddle_y, player, width=640, height=480):
+    # how far player's paddle is from where the ball will reach it, 0 while
+    # the ball moves towards the other player (for reward shaping)
+    _, intercept_y, towards = predict_intercept(x, y, xvelocity, yvelocity, width, height)
+    return numpy.where(towards == player, numpy.abs(intercept_y - paddle_y), 0.0)
+
+
+class Lockstep(object):
+    # Lets the game loop advance only when every computer player has
+    # submitted an action for the next frame.  Agents call step() and are
+    # released once the frame using their action has been simulated.
+
+    telemetry = None
+
+    def __init__(self, players):
+        self.condition = threading.Condition()
+        self.gated = [i for i in range(2) if players[i] == "computer"]
+        self.pending = [False, False]
+        self.frames_done = 0
+        self.taken_frame = [-1, -1]
+        self.started = False
+        self.closed = False
+
+    def step(self, player):
+        # Agent side: the action is already in the player's action slot
+        self.submit(player)
+        self.wait(player)
+
+    def submit(self, player):
+        # Agent side, first half of step(): lets the game take the action
+        # without waiting for the frame, so one agent can drive several games
+        self.condition.acquire()
+        self.pending[player] = True
+        self.condition.notify_all()
+        self.condition.release()
+
+    def wait(self, player):
+        # Agent side, second half of step(): until the frame has been simulated
+        if self.telemetry is not None:
+            start = timer()
+        self.condition.acquire()
+        while self.pending[player] and not self.closed:
+            self.condition.wait()
+        while self.frames_done <= self.taken_frame[player] and not self.closed:
+            self.condition.wait()
+        self.condition.release()
+        if self.telemetry is not None:
+            self.telemetry.observe(LOCKSTEP_AGENT_WAIT, timer() - start)
+
+    def next_frame(self):
+        # Game side: called at the start of every frame
+        if self.telemetry is not None:
+            start = timer()
+        self.condition.acquire()
+        if self.started:
+            self.frames_done += 1
+        self.started = True
+        self.condition.notify_all()
+        while not all(self.pending[i] for i in self.gated) and not self.closed:
+            self.condition.wait()
+        for i in self.gated:
+            self.pending[i] = False
+            self.taken_frame[i] = self.frames_done
+        self.condition.release()
+        if self.telemetry is not None:
+            self.telemetry.observe(LOCKSTEP_GAME_WAIT, timer() - start)
+
+    def close(self):
+        self.condition.acquire()
+        self.closed = True
+        self.condition.notify_all()
+        self.condition.release()
+
+
+class Body(object):
+    # Position, velocity and bounding box of a game object, with the same
+    # attribute names as sge.StellarClass.  The game logic only works on
+    # bodies; the sge backend draws each one through a sprite (its view).
+
+    view = None
+
+    def __init__(self, match, x, y, width, height):
+        self.match = match
+        self.x = x
+        self.y = y
+        self.xvelocity = 0
+        self.yvelocity = 0
+        self.half_width = width / 2
+        self.half_height = height / 2
+
+    @property
+    def bbox_left(self):
+        return self.x - self.half_width
+
+    @bbox_left.setter
+    def bbox_left(self, value):
+        self.x = value + self.half_width
+
+    @property
+    def bbox_right(self):
+        return self.x + self.half_width
+
+    @bbox_right.setter
+    def bbox_right(self, value):
+        self.x = value - self.half_width
 
+    @property
+    def bbox_top(self):
+        return self.y - self.half_height
 
+    @bbox_top.setter
+    def bbox_top(self, value):
+        self.y = value + self.half_height
 
-class glob:
-    # This class is for global variables.  While not necessary, using a
-    # container class like this is less potentially confusing than using
-    # actual global variables.
+    @property
+    def bbox_bottom(self):
+        return self.y + self.half_height
 
-    players = [None, None]
-    ball = None
-    hud_sprite = None
-    bounce_sound = None
-    bounce_wall_sound = None
-    score_sound = None
-    game_in_progress = True
-    sim_time = 0.0
+    @bbox_bottom.setter
+    def bbox_bottom(self, value):
+        self.y = value - self.half_height
 
-    hits = [0, 0]
-    misses = [0, 0]
+    def collides(self, other):
+        return (self.bbox_left < other.bbox_right and self.bbox_right > other.bbox_left and
+                self.bbox_top < other.bbox_bottom and self.bbox_bottom > other.bbox_top)
 
-class Game(sge.Game):
+
+class Game(sge.Game if sge is not None else object):
+    match = None
+
+    def event_step(self, time_passed):
+        # the match runs the game logic, sge only draws the result
+        self.match.step(time_passed)
+        for obj in self.match.players + [self.match.ball]:
+            obj.view.x = obj.x
+            obj.view.y = obj.y
 
     def event_key_press(self, key, char):
         if key == 'f8':
@@ -73,65 +384,116 @@ class Game(sge.Game):
         self.event_close()
 
 #    def event_step(self, t):
-#        if glob.sim_time % 0.01 <= 0.001:
-#            glob.hud_sprite.draw_clear()
-#            glob.hud_sprite.draw_text("hud", "%.2f" % glob.sim_time, sge.game.width / 2,
+#        if self.match.sim_time % 0.01 <= 0.001:
+#            self.match.hud_sprite.draw_clear()
+#            self.match.hud_sprite.draw_text("hud", "%.2f" % self.match.sim_time, sge.game.width / 2,
 #                                              0, color="white",
 #                                              halign=sge.ALIGN_RIGHT,
 #                                              valign=sge.ALIGN_TOP)
 
 
-class ComputerPlayer(sge.StellarClass):
-    lock = None
-    queue = None
+class ComputerPlayer(Body):
+    action = None
 
-    state_lock = None
-    state_queue = None
-    reward_lock = None
-    reward_queue = None
-
-    def __init__(self, lock, queue, reward_lock, reward_queue, player_num):
-        x = 32 if player_num == 0 else sge.game.width - 32
-        y = sge.game.height / 2
+    def __init__(self, match, action, player_num):
+        x = PADDLE_OFFSET if player_num == 0 else match.width - PADDLE_OFFSET
+        y = match.height / 2
         self.player_num = player_num
         self.hit_direction = 1 if player_num == 0 else -1
-        self.lock = lock
-        self.queue = queue
-        self.reward_lock = reward_lock
-        self.reward_queue = reward_queue
-        super(ComputerPlayer, self).__init__(x, y, sprite="paddle_pc")
+        self.action = action
+        super(ComputerPlayer, self).__init__(match, x, y, PADDLE_WIDTH, PADDLE_HEIGHT)
 
     def event_step(self, time_passed):
-        move_direction = 0
-        self.lock.acquire()
-        while not self.queue.empty():
-            move_direction = self.queue.get()
-#            if self.player_num == 1: # don't want to double count
-#                glob.sim_time += SIM_STEP
-        self.lock.release()
+        # event-driven games hold the latest direction until it is changed
+        if self.match.event_driven:
+            move_direction = self.action.latest()
+        else:
+            move_direction = self.action.take()
+#        if self.player_num == 1: # don't want to double count
+#            self.match.sim_time += SIM_STEP
+        self.steer(move_direction)
+
+    def steer(self, move_direction):
         self.yvelocity = move_direction * COMPUTER_PADDLE_SPEED
 
         # Keep the paddle inside the window
         if self.bbox_top < 0:
             self.bbox_top = 0
-        elif self.bbox_bottom > sge.game.height:
-            self.bbox_bottom = sge.game.height
+        elif self.bbox_bottom > self.match.height:
+            self.bbox_bottom = self.match.height
 
-#        if self.y > sge.game.height:
+#        if self.y > self.match.height:
 #            self.y = 0
 #        if self.y < 0:
-#            self.y = sge.game.height
+#            self.y = self.match.height
+        return self.yvelocity
+
+    def coast(self, frames):
+        # frames of event_step with the latest direction held: the paddle
+        # sticks one step past the edge it runs into
+        speed = self.steer(self.action.latest())
+        top = self.half_height
+        bottom = self.match.height - self.half_height
+        y = min(max(self.y, top), bottom)
+        if speed > 0:
+            y = min(y + frames * speed, bottom + speed)
+        elif speed < 0:
+            y = max(y + frames * speed, top + speed)
+        self.y = y
+
+
+class PerfectPlayer(ComputerPlayer):
+    # Ignores agent actions and moves towards the predicted intercept of the
+    # ball with its paddle, or back to the middle while the ball moves away.
+
+    def __init__(self, match, player_num):
+        super(PerfectPlayer, self).__init__(match, None, player_num)
+
+    def target(self):
+        ball = self.ball_towards_me()
+        if ball is None:
+            y = self.match.height / 2
+        else:
+            _, y, _ = predict_intercept(ball.x, ball.y, ball.xvelocity, ball.yvelocity,
+                                        self.match.width, self.match.height)
+        # never push into a wall
+        return min(max(y, self.half_height), self.match.height - self.half_height)
+
+    def ball_towards_me(self):
+        ball = self.match.ball
+        if ball.xvelocity * self.hit_direction < 0:
+            return ball
+        return None
+
+    def direction(self, target):
+        distance = target - self.y
+        if abs(distance) < COMPUTER_PADDLE_SPEED:
+            return 0
+        return 1 if distance > 0 else -1
+
+    def event_step(self, time_passed):
+        self.steer(self.direction(self.target()))
+
+    def coast(self, frames):
+        # the intercept doesn't change while the ball flies straight, so the
+        # paddle moves towards it until it is within one step, then stops
+        target = self.target()
+        speed = self.steer(self.direction(target))
+        if speed:
+            moves = min(frames, int(abs(target - self.y) / COMPUTER_PADDLE_SPEED))
+            self.y += moves * speed
 
-class Player(sge.StellarClass):
 
-    def __init__(self, player_num):
+class Player(Body):
+
+    def __init__(self, match, player_num):
         self.up_key = "up"
         self.down_key = "down"
-        x = 32 if player_num == 0 else sge.game.width - 32
+        x = PADDLE_OFFSET if player_num == 0 else match.width - PADDLE_OFFSET
         self.player_num = player_num
         self.hit_direction = 1 if player_num == 0 else -1
-        y = sge.game.height / 2
-        super(Player, self).__init__(x, y, 0, sprite="paddle")
+        y = match.height / 2
+        super(Player, self).__init__(match, x, y, PADDLE_WIDTH, PADDLE_HEIGHT)
 
     def event_step(self, time_passed):
         # Movement
@@ -143,28 +505,24 @@ class Player(sge.StellarClass):
         # Keep the paddle inside the window
         if self.y < 0:
             self.y = 0
-        elif self.y > sge.game.height:
-            self.y = sge.game.height
+        elif self.y > self.match.height:
+            self.y = self.match.height
 
 
 
 
-class Ball(sge.StellarClass):
-    reward_lock = None
-    reward_queue = None
-    state_lock = None
-    state_queue = None
+class Ball(Body):
+    rewards = None
+    state = None
 
 
-    def __init__(self, reward_lock, reward_queue, state_lock, state_queue):
-        x = sge.game.width / 2
-        y = sge.game.height / 2
-        self.reward_lock = reward_lock
-        self.reward_queue = reward_queue
-        self.state_lock = state_lock
-        self.state_queue = state_queue
+    def __init__(self, match, rewards, state):
+        x = match.width / 2
+        y = match.height / 2
+        self.rewards = rewards
+        self.state = state
 
-        super(Ball, self).__init__(x, y, 1, sprite="ball")
+        super(Ball, self).__init__(match, x, y, BALL_SIZE, BALL_SIZE)
 
     def event_create(self):
         self.serve()
@@ -174,42 +532,39 @@ class Ball(sge.StellarClass):
         loser = None
         if self.bbox_right < 0:
             loser = 0
-        elif self.bbox_left > sge.game.width:
+        elif self.bbox_left > self.match.width:
             loser = 1
 
         if loser is not None:
-            glob.misses[loser] += 1
+            self.match.misses[loser] += 1
 
             self.serve(1 if loser == 0 else -1)
 
-            self.reward_lock[loser].acquire()
-            if not self.reward_queue[loser].full():
-#                self.reward_queue[loser].put(-abs(glob.ball.y - glob.players[loser].y) + 50)
-                self.reward_queue[loser].put(-1)
-            self.reward_lock[loser].release()
+#            self.rewards.add(loser, -abs(self.y - self.match.players[loser].y) + 50)
+            self.rewards.add(loser, -1)
 
 
         # Bouncing off of the edges
-        if self.bbox_bottom > sge.game.height:
-            self.bbox_bottom = sge.game.height
-            self.yvelocity = -abs(self.yvelocity) * 0.75
+        if self.bbox_bottom > self.match.height:
+            self.bbox_bottom = self.match.height
+            self.yvelocity = -abs(self.yvelocity) * WALL_DAMPING
 #            self.yvelocity = 0
         elif self.bbox_top < 0:
             self.bbox_top = 0
-            self.yvelocity = abs(self.yvelocity) * 0.75
+            self.yvelocity = abs(self.yvelocity) * WALL_DAMPING
 #            self.yvelocity = 0
-#        if self.y > sge.game.height:
+#        if self.y > self.match.height:
 #            self.y = 0
 #        if self.y < 0:
-#            self.y = sge.game.height
+#            self.y = self.match.height
+
+        if self.match.lockstep is None:
+            self.publish_state()
 
-        self.state_lock.acquire()
-        if not self.state_queue.full():
-            self.state_queue.put(glob.ball.x)
-            self.state_queue.put(glob.ball.y)
-            self.state_queue.put(glob.players[0].y)
-            self.state_queue.put(glob.players[1].y)
-        self.state_lock.release()
+    def publish_state(self):
+        # single write into the shared snapshot, readers copy it lock-free
+        self.state.write((self.x, self.y, self.xvelocity, self.yvelocity,
+                          self.match.players[0].y, self.match.players[1].y))
 
 
     def event_collision(self, other):
@@ -224,16 +579,13 @@ class Ball(sge.StellarClass):
                 hitter = 1
             self.yvelocity += (self.y - other.y) * (PADDLE_VERTICAL_FORCE + 0.01)
 
-            glob.hits[hitter] += 1
+            self.match.hits[hitter] += 1
 
-            self.reward_lock[hitter].acquire()
-            if not self.reward_queue[hitter].full():
-                self.reward_queue[hitter].put(1)
-            self.reward_lock[hitter].release()
+            self.rewards.add(hitter, 1)
 
     def serve(self, direction=1):
-        self.x = sge.game.width / 2 + (200 if direction == -1 else -200)
-        self.y = random.randint(0, sge.game.height)
+        self.x = self.match.width / 2 + (200 if direction == -1 else -200)
+        self.y = self.match.rng.randint(0, self.match.height)
 
         # Next round
         self.xvelocity = BALL_START_SPEED * direction
@@ -241,32 +593,56 @@ class Ball(sge.StellarClass):
 
 
 
-def main(players, action_lock, action_queue, reward_lock, reward_queue, state_lock, state_queue, seed=None):
-    random.seed(seed)
+def main(players, actions, rewards, state, match=None, seed=None, fps=120, lockstep=None,
+         headless=False, event_driven=False):
+    if match is None:
+        match = Match(seed)
+    match.lockstep = lockstep
+    match.event_driven = event_driven
+    if headless and "human" in players:
+        raise ValueError("human players need the sge window")
+    if event_driven and not headless:
+        raise ValueError("event-driven simulation skips frames, it needs headless=True")
+    match.create_objects(players, actions, rewards, state)
+
+    if headless:
+        # no window, sprites, background or frame pacing: frames run back to
+        # back until the match is ended (in lockstep, as fast as the agents)
+        step = match.advance if event_driven else match.step
+        while match.game_in_progress:
+            step(HEADLESS_FRAME_TIME)
+    else:
+        run_window(match, fps)
+
+    # don't leave agents waiting for a frame that will never come
+    match.end()
+
 
+def run_window(match, fps):
     # Create Game object
-    Game(640, 480, fps=120)
+    game = Game(match.width, match.height, fps=fps)
+    game.match = match
 
     # Load sprites
-    paddle_sprite = sge.Sprite(ID="paddle", width=8, height=80, origin_x=4,
-                               origin_y=40)
+    paddle_sprite = sge.Sprite(ID="paddle", width=PADDLE_WIDTH, height=PADDLE_HEIGHT,
+                               origin_x=PADDLE_WIDTH / 2, origin_y=PADDLE_HEIGHT / 2)
     paddle_sprite.draw_rectangle(0, 0, paddle_sprite.width,
                                  paddle_sprite.height, fill="white")
 
-    paddle_sprite_pc = sge.Sprite(ID="paddle_pc", width=8, height=80, origin_x=4,
-                                  origin_y=40)
+    paddle_sprite_pc = sge.Sprite(ID="paddle_pc", width=PADDLE_WIDTH, height=PADDLE_HEIGHT,
+                                  origin_x=PADDLE_WIDTH / 2, origin_y=PADDLE_HEIGHT / 2)
     paddle_sprite_pc.draw_rectangle(0, 0, paddle_sprite.width,
                                  paddle_sprite.height, fill="white")
 
 
-    ball_sprite = sge.Sprite(ID="ball", width=32, height=32, origin_x=16,
-                             origin_y=16)
+    ball_sprite = sge.Sprite(ID="ball", width=BALL_SIZE, height=BALL_SIZE,
+                             origin_x=BALL_SIZE / 2, origin_y=BALL_SIZE / 2)
     ball_sprite.draw_rectangle(0, 0, ball_sprite.width, ball_sprite.height,
                                fill="white")
 
-#    glob.hud_sprite = sge.Sprite(width=320, height=160, origin_x=160,
+#    match.hud_sprite = sge.Sprite(width=320, height=160, origin_x=160,
 #                                 origin_y=0)
-#    hud = sge.StellarClass(sge.game.width / 2, 0, -10, sprite=glob.hud_sprite,
+#    hud = sge.StellarClass(sge.game.width / 2, 0, -10, sprite=match.hud_sprite,
 #                           detects_collisions=False)
 
     # Load backgrounds
@@ -277,14 +653,16 @@ def main(players, action_lock, action_queue, reward_lock, reward_queue, state_lo
 #    # Load fonts
 #    sge.Font('Liberation Mono', ID="hud", size=24)
 
-    # Create objects
-    for i in range(2):
-        glob.players[i] = Player(i) if players[i] == "human" else \
-                          ComputerPlayer(action_lock[i], action_queue[i],
-                                         reward_lock[i], reward_queue[i], i)
-    glob.ball = Ball(reward_lock, reward_queue, state_lock, state_queue)
+    # Create the sprites that draw the match's objects; movement and
+    # collisions are handled by the match itself
+    for player in match.players:
+        sprite = "paddle" if isinstance(player, Player) else "paddle_pc"
+        player.view = sge.StellarClass(player.x, player.y, 0, sprite=sprite,
+                                       detects_collisions=False)
+    match.ball.view = sge.StellarClass(match.ball.x, match.ball.y, 1, sprite="ball",
+                                       detects_collisions=False)
 
-    objects = glob.players + [glob.ball]
+    objects = [obj.view for obj in match.players + [match.ball]]
 
     # Create rooms
     room1 = sge.Room(objects, background=background)
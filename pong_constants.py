@@ -0,0 +1,16 @@
+# Physics and geometry of the Pong game, shared by the sge/headless game in
+# pong.py and the engines that must import without sge (pong_vector,
+# pong_pixels).
+
+PADDLE_SPEED = 2
+COMPUTER_PADDLE_SPEED = 2
+PADDLE_VERTICAL_FORCE = 1 / 12
+BALL_START_SPEED = 2
+BALL_ACCELERATION = 0.1
+BALL_MAX_SPEED = 15
+
+PADDLE_WIDTH = 8
+PADDLE_HEIGHT = 80
+PADDLE_OFFSET = 32
+BALL_SIZE = 32
+WALL_DAMPING = 0.75
@@ -1,28 +1,70 @@
-import Queue
+import json
+import multiprocessing
+import sys
 import threading
 import pong
+from pong_shared import (StateSnapshot, RewardAccumulator, ActionSlot, Telemetry, new_array,
+                         timer, STATE_FIELDS, BALL_X, BALL_Y, BALL_XVELOCITY, BALL_YVELOCITY,
+                         PADDLE0_Y, PADDLE1_Y,
+                         STATES_SKIPPED, REWARD_EVENTS, MOVE_TIME)
+from pong_pixels import Rasterizer, FrameStack
+from trajectory_log import TrajectoryWriter
 
-class PongGame(threading.Thread):
-    def __init__(self, players, bins=480, seed=None):
+class PongEnvironment(object):
+    # Agent side of a game: actions, rewards, state and hit/miss counters all
+    # go through the buffers from pong_shared, so the game itself can run in
+    # a thread (PongGame) or in a child process (PongProcess).
+
+    def __init__(self, players, bins=480, seed=None, lockstep=None, fps=120, shared=False,
+                 headless=False, event_driven=False, telemetry=False, waitable=False):
         self.players = players
         self.seed = seed
+        self.lockstep = lockstep
+        self.fps = fps
+        self.headless = headless
+        self.event_driven = event_driven
+
+        # counters and latency histograms of the game loop and of this side,
+        # off unless asked for
+        self.telemetry = Telemetry(shared) if telemetry else None
+        self.dumper = None
+        self.submitted = [0.0, 0.0] # submit times, for MOVE_TIME
+        self.submitted_directions = [0, 0]
+        self.previous_directions = [0, 0] # last ones handed to the game
+
+        self.actions = [ActionSlot(shared, self.telemetry) for _ in range(2)]
+
+        self.rewards = RewardAccumulator(shared)
 
-        self.action_queue = [Queue.Queue(1) for _ in range(2)]
-        self.action_lock = [threading.Lock() for _ in range(2)]
+        # wait_for_frame needs a condition notified on every state write,
+        # which costs the game a lock per frame, so it is only there if asked for
+        self.snapshot = StateSnapshot(shared, self.telemetry, waitable)
+        self.state_seq = 0 # nothing written yet
 
-        self.reward_queue = [Queue.Queue(1) for _ in range(2)]
-        self.reward_lock = [threading.Lock() for _ in range(2)]
+        self.hits = new_array('L', 2, shared)
+        self.misses = new_array('L', 2, shared)
 
-        self.state_queue = Queue.Queue(4 * 1024)
-        self.state_lock = threading.Lock()
+        # per-game objects, counters and serve RNG; nothing lives on the
+        # pong module, so several games can share an interpreter
+        self.match = pong.Match(seed, self.hits, self.misses)
+        self.match.telemetry = self.telemetry
+        if lockstep is not None:
+            lockstep.telemetry = self.telemetry
 
         self.world_dim = {'ball_y':bins, 'paddle': bins}
+        # pixels per bin, so binning a state is one division per value
+        self.bin_size = [self.match.height / float(bins)] * 2
         self.num_possible_moves = 3
 
         self.state = [1, 0, 0] # ball_y, paddle0, paddle1
+        self.raw_state = [0.0] * len(STATE_FIELDS)
 
+        self.log = None
+        self.logged_misses = [0, 0]
 
-        threading.Thread.__init__(self)
+        self.rasterizer = None
+        self.frames = None
+        self.pixel_seq = 0
 
     def getWorldDim(self):
         return [self.world_dim['ball_y'], self.world_dim['paddle']]
@@ -31,54 +73,214 @@ class PongGame(threading.Thread):
         return self.num_possible_moves
 
     def move(self, direction, player):
+        if self.telemetry is not None:
+            start = timer()
+        self.put_action(direction, player)
+        r = self.take_reward(player)
+        s = self.getState(player)
+        if self.log is not None:
+            # the game hasn't used this direction yet, r and s are the effect
+            # of the previous one
+            self.log_step(self.previous_directions[player], r, player)
+        self.previous_directions[player] = direction
+        if self.telemetry is not None:
+            self.telemetry.observe(MOVE_TIME, timer() - start)
+        return [s, r]
+
+    def step(self, direction, player):
+        # lockstep version of move: blocks until the frame using this action
+        # has been simulated and returns the resulting state and reward
+        if self.lockstep is None:
+            raise ValueError("step() needs a game created with lockstep=True")
+        self.submit(direction, player)
+        return self.collect(player)
+
+    def submit(self, direction, player):
+        # first half of step (or move without lockstep): hand the action to
+        # the game without waiting for it, so several players or games can
+        # be submitted before collecting any of them
+        if self.telemetry is not None:
+            self.submitted[player] = timer()
+        self.submitted_directions[player] = direction
+        self.put_action(direction, player)
+        if self.lockstep is not None:
+            self.lockstep.submit(player)
+
+    def collect(self, player):
+        # second half: wait for the lockstep frame if there is one and
+        # return [state, reward] like move and step
+        if self.lockstep is not None:
+            self.lockstep.wait(player)
+        r = self.take_reward(player)
+        s = self.getState(player)
+        direction = self.submitted_directions[player]
+        if self.log is not None:
+            # only a lockstep frame has applied the direction just submitted
+            self.log_step(direction if self.lockstep is not None
+                          else self.previous_directions[player], r, player)
+        self.previous_directions[player] = direction
+        if self.telemetry is not None:
+            self.telemetry.observe(MOVE_TIME, timer() - self.submitted[player])
+        return [s, r]
+
+    def put_action(self, direction, player):
         if direction == 2:
-            direction = -1 #convert to pong actions 
+            direction = -1 #convert to pong actions
 
-        self.action_lock[player].acquire()
-        if not self.action_queue[player].empty():
-            self.action_queue[player].get()
-        self.action_queue[player].put(direction)
-        self.action_lock[player].release()
+        self.actions[player].put(direction)
 
-        self.reward_lock[player].acquire()
-        if not self.reward_queue[player].empty():
-            r = self.reward_queue[player].get()
-        else:
-            r = 0
-        self.reward_lock[player].release()
+    def take_reward(self, player):
+        # everything received since the last call, nothing is dropped
+        r, events = self.rewards.take(player)
+        if events and self.telemetry is not None:
+            self.telemetry.count(REWARD_EVENTS, events)
+        return r
 
-        return [self.getState(player), r]
+    def record(self, path):
+        # log every move/step to an append-only trajectory file
+        self.logged_misses = list(self.misses)
+        self.log = TrajectoryWriter(path)
+
+    def stop_recording(self):
+        log, self.log = self.log, None
+        log.close()
+
+    def log_step(self, direction, r, player):
+        if direction == 2:
+            direction = -1
+        misses = self.misses[player]
+        done = misses != self.logged_misses[player]
+        self.logged_misses[player] = misses
+        self.log.append(self.raw_state, direction, r, player, done)
 
     def get_stats(self):
-        return pong.glob.hits + pong.glob.misses
+        return self.hits[:] + self.misses[:]
+
+    def get_telemetry(self):
+        # dict of counters and histogram summaries, see Telemetry.snapshot
+        return self.telemetry.snapshot()
+
+    def dump_telemetry(self, interval=10.0, stream=None):
+        # write a JSON line of get_telemetry() every interval seconds until
+        # stop_dumping(), from a daemon thread
+        stream = sys.stderr if stream is None else stream
+        stop = threading.Event()
+
+        def dump():
+            while not stop.wait(interval):
+                stream.write(json.dumps(self.get_telemetry()) + "\n")
+                stream.flush()
+
+        self.dumper = stop
+        thread = threading.Thread(target=dump)
+        thread.daemon = True
+        thread.start()
+
+    def stop_dumping(self):
+        self.dumper.set()
+        self.dumper = None
 
     def update_state(self):
-        self.state_lock.acquire()
-        while not self.state_queue.empty():
-            ball_x = self.state_queue.get()
-            self.state[0] = min(self.world_dim['ball_y'] - 1, # -1 to avoid running off end of array
-                                int(self.state_queue.get() / (480.0 / self.world_dim['ball_y'])))
-            self.state[1] = min(self.world_dim['paddle'] - 1,
-                                int(self.state_queue.get() / (480.0 / self.world_dim['paddle'])))
-            self.state[2] = min(self.world_dim['paddle'] - 1,
-                                int(self.state_queue.get() / (480.0 / self.world_dim['paddle'])))
-        self.state_lock.release()
+        seq, values = self.snapshot.read()
+        if seq == self.state_seq:
+            return
+        if self.telemetry is not None and seq - self.state_seq > 2:
+            # every write adds 2 to the sequence number
+            self.telemetry.count(STATES_SKIPPED, (seq - self.state_seq) // 2 - 1)
+        # swapped in as a whole so concurrent readers never see a mix
+        ball_size, paddle_size = self.bin_size
+        self.state = [min(self.world_dim['ball_y'] - 1, # -1 to avoid running off end of array
+                          int(values[BALL_Y] / ball_size))] + \
+                     [min(self.world_dim['paddle'] - 1, int(y / paddle_size))
+                      for y in values[PADDLE0_Y:]]
+        self.raw_state = values
+        self.state_seq = seq
+
+    def wait_for_frame(self, timeout=None):
+        # block until the game has written a state this side hasn't seen
+        # yet (without busy waiting), then take it over like getState does.
+        # Returns False on timeout, e.g. after the game has ended.  Needs a
+        # game created with waitable=True.
+        if self.snapshot.condition is None:
+            raise ValueError("wait_for_frame() needs a game created with waitable=True")
+        if not self.snapshot.wait(self.state_seq, timeout):
+            return False
+        self.update_state()
+        return True
 
     def getState(self, player):
         self.update_state()
-        self.state_lock.acquire()
-        if player == 0:
-            s = [self.state[0], self.state[1]]
-        else:
-            s = [self.state[0], self.state[2]]
-        self.state_lock.release()
-        return s
+        s = self.state
+        return [s[0], s[1 + player]]
+
+    def getObservation(self, player):
+        # continuous observation: ball x, y, x velocity, y velocity and the
+        # player's paddle y, unbinned (see getObservationBounds, TileCoder)
+        self.update_state()
+        v = self.raw_state
+        return [v[BALL_X], v[BALL_Y], v[BALL_XVELOCITY], v[BALL_YVELOCITY],
+                v[PADDLE0_Y + player]]
+
+    def getObservationBounds(self):
+        # (low, high) of every getObservation value
+        width, height = self.match.width, self.match.height
+        speed = pong.BALL_MAX_SPEED
+        return ([0, 0, -speed, -speed, 0], [width, height, speed, speed, height])
+
+    def enable_pixels(self, scale=8, depth=4):
+        # optional pixel observations for getPixels, drawn on the agent side
+        self.rasterizer = Rasterizer(self.match.width, self.match.height, scale)
+        self.frames = FrameStack(depth, self.rasterizer.shape)
+
+    def getPixels(self):
+        # the last depth frames (oldest first) as a view into the ring
+        # buffer; only a new game state is drawn, into a preallocated frame
+        seq, values = self.snapshot.read()
+        if seq != self.pixel_seq:
+            self.rasterizer.draw((values[BALL_X], values[BALL_Y],
+                                  values[PADDLE0_Y], values[PADDLE1_Y]),
+                                 self.frames.next_frame())
+            self.frames.commit()
+            self.pixel_seq = seq
+        return self.frames.stacked()
 
     def run(self):
-        pong.main(self.players, self.action_lock, self.action_queue,
-                  self.reward_lock, self.reward_queue, self.state_lock, self.state_queue,
-                  seed=self.seed)
+        pong.main(self.players, self.actions, self.rewards, self.snapshot,
+                  match=self.match, fps=self.fps, lockstep=self.lockstep,
+                  headless=self.headless, event_driven=self.event_driven)
+
+
+class PongGame(PongEnvironment, threading.Thread):
+    def __init__(self, players, bins=480, seed=None, lockstep=False, fps=None, headless=False,
+                 event_driven=False, telemetry=False, waitable=False):
+        # in lockstep mode the game only advances once every computer player
+        # has called step(); without a human to pace for it runs uncapped.
+        # A headless game has no window and is never paced; an event-driven
+        # one also jumps straight to the next bounce, paddle contact or score
+        # (each step() then covers that whole interval).  waitable=True
+        # enables wait_for_frame().
+        if fps is None:
+            fps = pong.UNCAPPED_FPS if lockstep and "human" not in players else 120
+        PongEnvironment.__init__(self, players, bins, seed,
+                                 pong.Lockstep(players) if lockstep else None, fps,
+                                 headless=headless, event_driven=event_driven,
+                                 telemetry=telemetry, waitable=waitable)
+
+        threading.Thread.__init__(self)
 
+    def stop(self):
+        # ends a headless game (a windowed one ends when its window closes)
+        self.match.end()
 
 
+class PongProcess(PongEnvironment, multiprocessing.Process):
+    # Runs pong.main in a child process so the game loop and the agent don't
+    # compete for the GIL.  Only the shared-memory buffers cross the process
+    # boundary; lockstep is not available here.
+    def __init__(self, players, bins=480, seed=None, fps=120, headless=False,
+                 event_driven=False, telemetry=False, waitable=False):
+        PongEnvironment.__init__(self, players, bins, seed, fps=fps, shared=True,
+                                 headless=headless, event_driven=event_driven,
+                                 telemetry=telemetry, waitable=waitable)
 
+        multiprocessing.Process.__init__(self)
@@ -1,70 +1,124 @@
 import time
+import numpy
 import numpy.random as rand
 import sys
 
 world_dim = {'ball_y':12, 'paddle': 12}
 num_possible_moves = 3
 
-
-global num_reward, num_punishment, state
-num_reward = 1
-num_punishment = 1
-
-state = (1,0) # ball_x, ball_y, paddle
-last_outcomes = [0]
-
-beam_next = False
-beam_timer = 2
+REWARD = 600
+PUNISHMENT = -10
+BEAM_DELAY = 2
+
+
+class GridWorld(object):
+	# N independent grid worlds advanced together.  The state of world i is
+	# states[i] = (ball_y, paddle); every move the paddle goes up/down, is
+	# kept on the grid and gets +600 if it is level with the ball, else -10.
+	# After a catch the ball and paddle are beamed to a random cell two
+	# moves later.
+
+	def __init__(self, num_worlds=1, ball_y=world_dim['ball_y'], paddle=world_dim['paddle'],
+	             seed=None):
+		self.num_worlds = num_worlds
+		self.world_dim = {'ball_y': ball_y, 'paddle': paddle}
+		# without a seed the worlds share numpy's global RNG, like the
+		# module functions always did
+		self.rng = rand if seed is None else rand.RandomState(seed)
+
+		self.states = numpy.zeros((num_worlds, 2), dtype=int)
+		self.states[:, 0] = 1
+		self.ball = self.states[:, 0]
+		self.paddle = self.states[:, 1]
+		self.beam_next = numpy.zeros(num_worlds, dtype=bool)
+		self.beam_timer = numpy.full(num_worlds, BEAM_DELAY)
+		self.outcomes = numpy.empty(num_worlds, dtype=int)
+		# actions submitted by vector_env.GridWorldEnv members for the next
+		# move; pending once any of them has submitted
+		self.directions = numpy.zeros(num_worlds, dtype=int)
+		self.pending = False
+
+	def getWorldDim(self):
+		return [self.world_dim['ball_y'], self.world_dim['paddle']]
+
+	def getActionDim(self):
+		return num_possible_moves
+
+	def checkValid(self):
+		numpy.clip(self.paddle, 0, self.world_dim['paddle'] - 1, out=self.paddle)
+
+	def randomBeam(self, worlds=None):
+		# worlds: boolean mask or indices of the worlds to beam (all if None)
+		if worlds is None:
+			worlds = slice(None)
+		count = len(self.ball[worlds])
+		if count == 0:
+			return
+		self.ball[worlds] = self.rng.randint(0, self.world_dim['ball_y'], size=count)
+		self.paddle[worlds] = self.rng.randint(0, self.world_dim['paddle'], size=count)
+
+	def reset(self, worlds=None):
+		# start a new episode: random cell, no beam pending
+		if worlds is None:
+			worlds = slice(None)
+		self.randomBeam(worlds)
+		self.beam_next[worlds] = False
+		self.beam_timer[worlds] = BEAM_DELAY
+
+	def move(self, directions):
+		"""Move every paddle by its action (0 stay, 1 down, 2 or -1 up).
+
+		Returns [states, outcomes]; both arrays are reused by the next move.
+		"""
+		directions = numpy.asarray(directions)
+		self.paddle[directions == 1] += 1
+		self.paddle[(directions == 2) | (directions == -1)] -= 1
+
+		beaming = self.beam_next
+		if beaming.any():
+			due = beaming & (self.beam_timer <= 0)
+			self.beam_timer[beaming & ~due] -= 1
+			if due.any():
+				self.randomBeam(due)
+				self.beam_next[due] = False
+				self.beam_timer[due] = BEAM_DELAY
+
+		self.checkValid()
+
+		caught = self.ball == self.paddle
+		self.outcomes.fill(PUNISHMENT)
+		self.outcomes[caught] = REWARD
+		self.beam_next |= caught
+
+		return [self.states, self.outcomes]
+
+	def getState(self):
+		return self.states
+
+
+# the module functions play a single world
+world = GridWorld(1)
 
 def getWorldDim():
-	return [world_dim['ball_y'], world_dim['paddle']] 
+	return world.getWorldDim()
 
 def getActionDim():
-	return num_possible_moves
+	return world.getActionDim()
 
 def checkValid():
-	global state
-	if state[1] < 0:
-		state = (state[0], 0) # -= 1
-	if state[1] > world_dim['paddle']-1:
-		state = (state[0], world_dim['paddle']-1) # -= 1
+	world.checkValid()
 
 def randomBeam():
-	global state
-	state = ( rand.randint(0, world_dim['ball_y']), rand.randint(0, world_dim['paddle']) )
+	world.randomBeam()
+
+def reset():
+	world.reset()
 
 def move(direction):
-	global num_reward, num_punishment, state, beam_next, beam_timer
-
-	if direction == 2:
-		direction = -1 #convert to pong actions 
-
-
-	if direction == -1:
-		state = (state[0], state[1]-1) # -= 1
-	elif direction == 1:
-		state = (state[0], state[1]+1)
-	
-	if beam_next:
-		if beam_timer <= 0:
-			randomBeam()
-			beam_next = False
-			beam_timer = 2
-		else:
-			beam_timer -= 1
-	
-	checkValid()	
-
-	outcome = -10
-	if (state[0] == state[1]):
-		outcome = 600
-		beam_next = True
-	
-	return [state, outcome]
+	states, outcomes = world.move([direction])
+	return [getState(), int(outcomes[0])]
 
 
 def getState():
-	return state
-
-
-
+	ball_y, paddle = world.states[0]
+	return (int(ball_y), int(paddle))
@@ -0,0 +1,75 @@
+import math
+
+import numpy
+
+from pong_constants import PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_OFFSET, BALL_SIZE
+
+
+class Rasterizer(object):
+    """Draws the ball and both paddles into downsampled uint8 frames.
+
+    Works directly from positions (a PongEnvironment snapshot or the rows of
+    VectorPong.get_state), so no sge window or screenshot is involved.
+    Objects are 255 on a 0 background.
+
+    :param scale: downsampling factor, a frame is (height / scale, width / scale)
+    """
+
+    def __init__(self, width=640, height=480, scale=8):
+        self.scale = float(scale)
+        self.shape = (int(math.ceil(height / self.scale)), int(math.ceil(width / self.scale)))
+        self.paddle_x = (PADDLE_OFFSET, width - PADDLE_OFFSET)
+
+    def new_frame(self, num_games=None):
+        shape = self.shape if num_games is None else (num_games,) + self.shape
+        return numpy.zeros(shape, dtype=numpy.uint8)
+
+    def draw(self, positions, out):
+        """Rasterize one game or a batch of games into out.
+
+        :param positions: (4,) or (N, 4) array of ball_x, ball_y, paddle0 y, paddle1 y
+        :param out: frame(s) from new_frame, overwritten in place
+        """
+        batch = numpy.asarray(positions, dtype=float).reshape(-1, 4)
+        frames = out.reshape((-1,) + self.shape)
+        frames.fill(0)
+        for frame, (ball_x, ball_y, paddle0_y, paddle1_y) in zip(frames, batch):
+            self._fill(frame, ball_x, ball_y, BALL_SIZE, BALL_SIZE)
+            self._fill(frame, self.paddle_x[0], paddle0_y, PADDLE_WIDTH, PADDLE_HEIGHT)
+            self._fill(frame, self.paddle_x[1], paddle1_y, PADDLE_WIDTH, PADDLE_HEIGHT)
+        return out
+
+    def _fill(self, frame, x, y, width, height):
+        # light every pixel whose cell overlaps the object's bounding box
+        scale = self.scale
+        top = max(int(math.floor((y - height / 2.0) / scale)), 0)
+        bottom = max(int(math.ceil((y + height / 2.0) / scale)), 0)
+        left = max(int(math.floor((x - width / 2.0) / scale)), 0)
+        right = max(int(math.ceil((x + width / 2.0) / scale)), 0)
+        frame[top:bottom, left:right] = 255
+
+
+class FrameStack(object):
+    """Ring buffer of the last depth frames, read back as a view.
+
+    Every frame is stored twice, depth slots apart, so the newest depth
+    frames are always one contiguous slice of the buffer and stacked()
+    never copies.  The view stays valid until the next commit().
+    """
+
+    def __init__(self, depth, shape, dtype=numpy.uint8):
+        self.depth = depth
+        self.buffer = numpy.zeros((2 * depth,) + tuple(shape), dtype=dtype)
+        self.index = 0
+
+    def next_frame(self):
+        # slot to draw the next frame into
+        return self.buffer[self.index]
+
+    def commit(self):
+        self.buffer[self.index + self.depth] = self.buffer[self.index]
+        self.index = (self.index + 1) % self.depth
+
+    def stacked(self):
+        """(depth, ...) view of the last frames, oldest first."""
+        return self.buffer[self.index:self.index + self.depth]
@@ -0,0 +1,237 @@
+import ctypes
+import multiprocessing
+import threading
+import time
+
+# layout of the state snapshot
+STATE_FIELDS = ("ball_x", "ball_y", "ball_xvelocity", "ball_yvelocity",
+                "paddle0_y", "paddle1_y")
+BALL_X, BALL_Y, BALL_XVELOCITY, BALL_YVELOCITY, PADDLE0_Y, PADDLE1_Y = range(len(STATE_FIELDS))
+
+CTYPES = {'d': ctypes.c_double, 'l': ctypes.c_long, 'L': ctypes.c_ulong}
+
+# telemetry counters and latency histograms
+COUNTERS = ("frames", "snapshot_retries", "states_skipped", "actions_overwritten",
+            "actions_idle", "reward_events")
+(FRAMES, SNAPSHOT_RETRIES, STATES_SKIPPED, ACTIONS_OVERWRITTEN,
+ ACTIONS_IDLE, REWARD_EVENTS) = range(len(COUNTERS))
+HISTOGRAMS = ("frame_time", "lockstep_game_wait", "lockstep_agent_wait", "move_time")
+FRAME_TIME, LOCKSTEP_GAME_WAIT, LOCKSTEP_AGENT_WAIT, MOVE_TIME = range(len(HISTOGRAMS))
+# bucket k holds latencies below 2**k microseconds
+BUCKETS = 32
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+def new_array(typecode, size, shared=False):
+    # zeroed ctypes array, in shared memory if it has to cross a process boundary
+    if shared:
+        return multiprocessing.RawArray(typecode, size)
+    return (CTYPES[typecode] * size)()
+
+
+class StateSnapshot(object):
+    """Latest game state in a fixed-layout, sequence-numbered buffer.
+
+    The game is the only writer.  The sequence number is odd while a write
+    is in progress, so readers copy the buffer without a lock and retry if
+    it changed underneath them (a seqlock).  A waitable snapshot also
+    wakes up readers blocked in wait() after every write.
+
+    :param shared: allocate the buffers in multiprocessing shared memory
+    :param waitable: support wait() (a condition notified on each write)
+    """
+
+    def __init__(self, shared=False, telemetry=None, waitable=False):
+        self.data = new_array('d', len(STATE_FIELDS), shared)
+        self.seq = new_array('L', 1, shared)
+        self.telemetry = telemetry
+        self.condition = None
+        if waitable:
+            self.condition = multiprocessing.Condition() if shared else threading.Condition()
+
+    def write(self, values):
+        self.seq[0] += 1
+        self.data[:] = values
+        self.seq[0] += 1
+        if self.condition is not None:
+            self.condition.acquire()
+            self.condition.notify_all()
+            self.condition.release()
+
+    def wait(self, seq, timeout=None):
+        """Block until a write newer than seq has finished.
+
+        Returns False if timeout seconds passed without one.
+        """
+        condition = self.condition
+        condition.acquire()
+        try:
+            # seq is read under the lock the writer notifies with, so a
+            # write can't slip in between the check and the wait
+            if timeout is None:
+                while self.seq[0] <= seq or self.seq[0] & 1:
+                    condition.wait()
+                return True
+            deadline = timer() + timeout
+            while self.seq[0] <= seq or self.seq[0] & 1:
+                remaining = deadline - timer()
+                if remaining <= 0:
+                    return False
+                condition.wait(remaining)
+            return True
+        finally:
+            condition.release()
+
+    def read(self):
+        """Return (sequence number, list of values) of the latest write."""
+        while True:
+            seq = self.seq[0]
+            if seq & 1:
+                # a write is in progress; yield instead of spinning on the GIL
+                # until the writer thread gets scheduled again
+                time.sleep(0)
+                continue
+            values = self.data[:]
+            if self.seq[0] == seq:
+                return seq, values
+            if self.telemetry is not None:
+                self.telemetry.count(SNAPSHOT_RETRIES)
+
+
+class RewardAccumulator(object):
+    """Per-player running reward totals and event counters.
+
+    The game only ever adds to the totals; each reader keeps the totals it
+    has already consumed, so take() returns everything that arrived since
+    the previous call without a lock or a queue and without dropping
+    rewards however slowly it is polled.
+
+    :param shared: allocate the totals in multiprocessing shared memory
+    """
+
+    def __init__(self, shared=False):
+        self.totals = new_array('d', 2, shared)
+        self.counts = new_array('L', 2, shared)
+        self.consumed_totals = [0.0, 0.0]
+        self.consumed_counts = [0, 0]
+
+    def add(self, player, reward):
+        self.totals[player] += reward
+        self.counts[player] += 1
+
+    def take(self, player):
+        """Return (reward, number of events) since the last take for player."""
+        # the count is written last, so read it first: a reward that lands in
+        # between is returned now and its event is counted by the next take
+        count = self.counts[player]
+        total = self.totals[player]
+        reward = total - self.consumed_totals[player]
+        events = count - self.consumed_counts[player]
+        self.consumed_totals[player] = total
+        self.consumed_counts[player] = count
+        return reward, events
+
+
+class ActionSlot(object):
+    """Latest action of one player, consumed at most once by the game.
+
+    The agent overwrites the direction and bumps the sequence number; the
+    game uses the direction only if the sequence number moved since it last
+    looked, otherwise the paddle stands still for that frame (the behaviour
+    of the old single-slot action queue).
+
+    :param shared: allocate the slot in multiprocessing shared memory
+    """
+
+    def __init__(self, shared=False, telemetry=None):
+        self.direction = new_array('l', 1, shared)
+        self.seq = new_array('L', 1, shared)
+        self.taken = 0
+        self.telemetry = telemetry
+
+    def put(self, direction):
+        self.direction[0] = direction
+        self.seq[0] += 1
+
+    def take(self):
+        seq = self.seq[0]
+        if self.telemetry is not None:
+            if seq == self.taken:
+                self.telemetry.count(ACTIONS_IDLE)
+            elif seq - self.taken > 1:
+                # put more than once between two frames, only the last counts
+                self.telemetry.count(ACTIONS_OVERWRITTEN, seq - self.taken - 1)
+        if seq == self.taken:
+            return 0
+        self.taken = seq
+        return self.direction[0]
+
+    def latest(self):
+        # last direction put, whether or not it has been taken
+        return self.direction[0]
+
+
+class Telemetry(object):
+    """Counters and log2 latency histograms for the game loop and env bridge.
+
+    Everything lives in flat ctypes arrays, so recording is an index and an
+    add, and a PongProcess child writes straight into the parent's view.
+    Each counter has one writing side (game or agent); updates from several
+    agent threads are not locked and may occasionally lose a count.
+
+    :param shared: allocate the arrays in multiprocessing shared memory
+    """
+
+    def __init__(self, shared=False):
+        self.counters = new_array('L', len(COUNTERS), shared)
+        self.buckets = new_array('L', len(HISTOGRAMS) * BUCKETS, shared)
+        self.totals = new_array('d', len(HISTOGRAMS), shared)
+        self.last_frame = None
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def observe(self, histogram, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), BUCKETS - 1)
+        self.buckets[histogram * BUCKETS + bucket] += 1
+        self.totals[histogram] += seconds
+
+    def frame(self):
+        # game side, once per frame: the time between two frames is the
+        # frame time the loop actually reaches
+        now = timer()
+        if self.last_frame is not None:
+            self.observe(FRAME_TIME, now - self.last_frame)
+        self.last_frame = now
+        self.counters[FRAMES] += 1
+
+    def snapshot(self):
+        """Copy of all counters and histogram summaries as a dict.
+
+        Latencies are in microseconds; percentiles are the upper bound of
+        the bucket they fall in.
+        """
+        buckets = self.buckets[:]
+        totals = self.totals[:]
+        histograms = {}
+        for i, name in enumerate(HISTOGRAMS):
+            counts = buckets[i * BUCKETS:(i + 1) * BUCKETS]
+            n = sum(counts)
+            histograms[name] = {'count': n,
+                                'mean_us': totals[i] * 1e6 / n if n else 0.0,
+                                'p50_us': percentile(counts, n, 0.5),
+                                'p99_us': percentile(counts, n, 0.99),
+                                'buckets': counts}
+        return {'counters': dict(zip(COUNTERS, self.counters[:])),
+                'histograms': histograms}
+
+
+def percentile(counts, n, q):
+    # upper bound in microseconds of the bucket holding the q quantile
+    seen = 0
+    for bucket, c in enumerate(counts):
+        seen += c
+        if n and seen >= q * n:
+            return 1 << bucket
+    return 0
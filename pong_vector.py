@@ -0,0 +1,147 @@
+import numpy
+
+from pong_constants import (COMPUTER_PADDLE_SPEED, PADDLE_VERTICAL_FORCE, BALL_START_SPEED,
+                            BALL_ACCELERATION, BALL_MAX_SPEED, PADDLE_WIDTH, PADDLE_HEIGHT,
+                            PADDLE_OFFSET, BALL_SIZE, WALL_DAMPING)
+
+# geometry of the pong.Body objects (origin at the centre)
+PADDLE_HALF_WIDTH = PADDLE_WIDTH / 2
+PADDLE_HALF_HEIGHT = PADDLE_HEIGHT / 2
+BALL_HALF_SIZE = BALL_SIZE / 2
+
+
+class VectorPong(object):
+    """Headless batch of independent Pong games advanced in lockstep.
+
+    Every game is two computer paddles and one ball, with the physics of
+    pong.ComputerPlayer and pong.Ball.  A frame is processed in the same
+    order as the sge loop: paddles take their action and are kept inside
+    the window, the ball scores/serves and bounces off the walls, all
+    objects move by their velocity and finally the ball is checked against
+    both paddles (axis aligned bounding boxes).
+
+    :param num_games: number of games N held in the arrays
+    :param seed: seed for the serve RNG
+    """
+
+    def __init__(self, num_games, seed=None, width=640, height=480,
+                 paddle_speed=COMPUTER_PADDLE_SPEED):
+        self.num_games = num_games
+        self.width = width
+        self.height = height
+        self.paddle_speed = paddle_speed
+        self.rng = numpy.random.RandomState(seed)
+
+        self.paddle_x = numpy.array([PADDLE_OFFSET, width - PADDLE_OFFSET], dtype=float)
+        self.paddle_y = numpy.empty((num_games, 2))
+        self.ball_x = numpy.empty(num_games)
+        self.ball_y = numpy.empty(num_games)
+        self.ball_xvelocity = numpy.empty(num_games)
+        self.ball_yvelocity = numpy.empty(num_games)
+
+        self.hits = numpy.zeros((num_games, 2), dtype=numpy.int64)
+        self.misses = numpy.zeros((num_games, 2), dtype=numpy.int64)
+        self.rewards = numpy.zeros((num_games, 2))
+
+        self.reset()
+
+    def reset(self, games=None):
+        """Put the paddles in the middle and serve a new ball.
+
+        :param games: index or boolean mask of the games to reset (all if None)
+        """
+        games = slice(None) if games is None else numpy.atleast_1d(games)
+        self.paddle_y[games] = self.height / 2
+        self.hits[games] = 0
+        self.misses[games] = 0
+        self.serve(games, 1)
+
+    def serve(self, games, direction):
+        # pong.Ball.serve for a subset of the games
+        count = len(self.ball_x[games])
+        if count == 0:
+            return
+        direction = numpy.broadcast_to(direction, (count,))
+        self.ball_x[games] = self.width / 2 + numpy.where(direction == -1, 200, -200)
+        self.ball_y[games] = self.rng.randint(0, self.height, size=count)
+        self.ball_xvelocity[games] = BALL_START_SPEED * direction
+        self.ball_yvelocity[games] = 0
+
+    def step(self, directions):
+        """Advance all games by one frame.
+
+        :param directions: (N, 2) array of paddle directions in {-1, 0, 1}
+        :returns: (N, 2) array with the reward of each player for this frame
+                  (the same buffer is reused by the next call)
+        """
+        rewards = self.rewards
+        rewards.fill(0)
+        height = self.height
+
+        # ComputerPlayer.event_step: the clamp happens before the move, so a
+        # paddle may overshoot the window edge by one step
+        paddle_y = self.paddle_y
+        numpy.clip(paddle_y, PADDLE_HALF_HEIGHT, height - PADDLE_HALF_HEIGHT, out=paddle_y)
+
+        # Ball.event_step: scoring
+        missed_left = self.ball_x + BALL_HALF_SIZE < 0
+        missed_right = self.ball_x - BALL_HALF_SIZE > self.width
+        if missed_left.any():
+            self.misses[missed_left, 0] += 1
+            rewards[missed_left, 0] -= 1
+            self.serve(missed_left, 1)
+        if missed_right.any():
+            self.misses[missed_right, 1] += 1
+            rewards[missed_right, 1] -= 1
+            self.serve(missed_right, -1)
+
+        # Ball.event_step: bouncing off the top and bottom edges
+        ball_y = self.ball_y
+        yvelocity = self.ball_yvelocity
+        bottom = ball_y + BALL_HALF_SIZE > height
+        top = ball_y - BALL_HALF_SIZE < 0
+        ball_y[bottom] = height - BALL_HALF_SIZE
+        ball_y[top] = BALL_HALF_SIZE
+        yvelocity[bottom] = -numpy.abs(yvelocity[bottom]) * WALL_DAMPING
+        yvelocity[top] = numpy.abs(yvelocity[top]) * WALL_DAMPING
+
+        # movement
+        paddle_y += directions * self.paddle_speed
+        self.ball_x += self.ball_xvelocity
+        ball_y += yvelocity
+
+        # Ball.event_collision
+        for player in (0, 1):
+            self._collide(player, rewards)
+
+        return rewards
+
+    def _collide(self, player, rewards):
+        paddle_x = self.paddle_x[player]
+        paddle_y = self.paddle_y[:, player]
+        hit = ((numpy.abs(self.ball_x - paddle_x) < BALL_HALF_SIZE + PADDLE_HALF_WIDTH) &
+               (numpy.abs(self.ball_y - paddle_y) < BALL_HALF_SIZE + PADDLE_HALF_HEIGHT))
+        if not hit.any():
+            return
+
+        speed = numpy.abs(self.ball_xvelocity[hit]) + BALL_ACCELERATION
+        offset = PADDLE_HALF_WIDTH + 1 + BALL_HALF_SIZE
+        if player == 0:
+            self.ball_x[hit] = paddle_x + offset
+            self.ball_xvelocity[hit] = numpy.minimum(speed, BALL_MAX_SPEED)
+        else:
+            self.ball_x[hit] = paddle_x - offset
+            self.ball_xvelocity[hit] = -numpy.minimum(speed, BALL_MAX_SPEED)
+        self.ball_yvelocity[hit] += ((self.ball_y[hit] - paddle_y[hit]) *
+                                     (PADDLE_VERTICAL_FORCE + 0.01))
+
+        self.hits[hit, player] += 1
+        rewards[hit, player] += 1
+
+    def get_state(self):
+        """(N, 4) array of ball_x, ball_y, paddle0 y, paddle1 y."""
+        return numpy.column_stack((self.ball_x, self.ball_y, self.paddle_y))
+
+    def get_stats(self):
+        """(N, 4) array of hits and misses, ordered like PongGame.get_stats."""
+        return numpy.hstack((self.hits, self.misses))
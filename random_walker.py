@@ -1,15 +1,12 @@
-import random
+import numpy
 from pong_environment_play import PongGame
-import time
+from vector_env import VectorEnv, PongGameEnv
 
-env = PongGame(["human", "computer"])
+env = PongGame(["human", "computer"], lockstep=True)
 env.start()
+envs = VectorEnv([PongGameEnv(env, 1)])
+envs.reset()
 while True:
-	time.sleep(0.05)
-	direction = random.randint(-1, 1)
-
-	outcome = 0
-	state, outcome = env.move(direction, 1)
-
-
+	actions = numpy.random.randint(0, 3, envs.num_envs)
 
+	states, outcomes, dones = envs.step(actions)
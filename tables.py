@@ -0,0 +1,136 @@
+import numpy
+
+# storage kinds for policy and value tables
+DENSE_DTYPES = {'float64': numpy.float64, 'float32': numpy.float32, 'float16': numpy.float16}
+
+
+def new_table(shape, kind='float64', init=None):
+    """New policy/value table of the given storage kind.
+
+    :param kind: 'float64', 'float32', 'float16' (dense numpy arrays) or
+                 'sparse' (SparseTable, unvisited cells take no memory)
+    :param init: dense tables only, function(*shape) returning the
+                 initial values (zeros if None); sparse cells start at 0
+    """
+    if kind == 'sparse':
+        return SparseTable(shape)
+    dtype = DENSE_DTYPES[kind]
+    if init is None:
+        return numpy.zeros(shape, dtype=dtype)
+    return numpy.asarray(init(*shape), dtype=dtype)
+
+
+def add_at(table, index, values):
+    # numpy.add.at for both kinds of table
+    if isinstance(table, SparseTable):
+        table.add_at(index, values)
+    else:
+        numpy.add.at(table, index, values)
+
+
+class SparseTable(object):
+    """Hashed table in which only written cells take memory.
+
+    A cell is a state, indexed by the first cell_ndim axes; its row holds
+    the values along the remaining axes (the actions of a policy) and is
+    allocated the first time the cell is written.  Indexing works like the
+    dense array with ints or equal-length index arrays: table[paddle, ball_y]
+    reads whole rows, table[paddle, ball_y, action] single entries.
+    Unwritten cells read as default.
+
+    :param shape: shape of the equivalent dense table
+    """
+
+    def __init__(self, shape, dtype=numpy.float32, default=0.0, cell_ndim=2):
+        self.shape = tuple(shape)
+        self.ndim = len(self.shape)
+        self.size = int(numpy.prod(self.shape))
+        self.dtype = numpy.dtype(dtype)
+        self.default = default
+        self.cell_ndim = cell_ndim
+        self.cell_shape = self.shape[:cell_ndim]
+        self.row_shape = self.shape[cell_ndim:]
+
+        self.slots = {} # flat cell index -> row of self.rows
+        self.rows = numpy.empty((16,) + self.row_shape, dtype=self.dtype)
+        self.count = 0
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _split(self, index):
+        # cells as a 1-d array, the per-entry index into the rows and
+        # whether the index was a single entry
+        if not isinstance(index, tuple):
+            index = (index,)
+        cells = numpy.ravel_multi_index(index[:self.cell_ndim], self.cell_shape)
+        scalar = numpy.ndim(cells) == 0
+        return numpy.atleast_1d(cells).ravel(), index[self.cell_ndim:], scalar
+
+    def _lookup(self, cells):
+        get = self.slots.get
+        return numpy.array([get(cell, -1) for cell in cells.tolist()], dtype=int)
+
+    def _allocate(self, cells):
+        slots = self.slots
+        for cell in cells.tolist():
+            if cell not in slots:
+                if self.count == len(self.rows):
+                    rows = numpy.empty((2 * len(self.rows),) + self.row_shape, dtype=self.dtype)
+                    rows[:self.count] = self.rows
+                    self.rows = rows
+                self.rows[self.count] = self.default
+                slots[cell] = self.count
+                self.count += 1
+        return self._lookup(cells)
+
+    def __getitem__(self, index):
+        cells, rest, scalar = self._split(index)
+        slots = self._lookup(cells)
+        out = numpy.full((len(slots),) + self.row_shape, self.default, dtype=self.dtype)
+        present = slots >= 0
+        out[present] = self.rows[slots[present]]
+        if rest:
+            out = out[(numpy.arange(len(slots)),) + rest]
+        return out[0] if scalar else out
+
+    def __setitem__(self, index, value):
+        cells, rest, _ = self._split(index)
+        slots = self._allocate(cells) # may grow self.rows
+        self.rows[(slots,) + rest] = value
+
+    def add_at(self, index, values):
+        cells, rest, _ = self._split(index)
+        slots = self._allocate(cells)
+        numpy.add.at(self.rows, (slots,) + rest, values)
+
+    def copy(self):
+        table = SparseTable(self.shape, self.dtype, self.default, self.cell_ndim)
+        table.slots = dict(self.slots)
+        table.rows = self.rows[:max(self.count, 1)].copy()
+        table.count = self.count
+        return table
+
+    def to_dense(self):
+        dense = numpy.full(self.shape, self.default, dtype=self.dtype)
+        rows = dense.reshape((-1,) + self.row_shape)
+        cells = numpy.fromiter(self.slots.keys(), dtype=int, count=len(self.slots))
+        slots = numpy.fromiter(self.slots.values(), dtype=int, count=len(self.slots))
+        rows[cells] = self.rows[slots]
+        return dense
+
+    def save(self, f):
+        # npz with the written cells and their rows
+        cells = numpy.fromiter(self.slots.keys(), dtype=numpy.int64, count=len(self.slots))
+        slots = numpy.fromiter(self.slots.values(), dtype=int, count=len(self.slots))
+        numpy.savez(f, shape=numpy.array(self.shape), cell_ndim=self.cell_ndim,
+                    default=self.default, cells=cells, rows=self.rows[slots])
+
+    @classmethod
+    def load(cls, npz):
+        table = cls(npz['shape'], npz['rows'].dtype, float(npz['default']), int(npz['cell_ndim']))
+        rows = npz['rows']
+        table.rows = rows.copy() if len(rows) else table.rows
+        table.slots = dict(zip(npz['cells'].tolist(), range(len(rows))))
+        table.count = len(rows)
+        return table
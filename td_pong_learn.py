@@ -3,108 +3,91 @@ import numpy
 import sys
 import time
 import os
-import json
 #import pong_environment as env 
 import pong_environment_training as env
-
-policy_filename = "pong_policy.dat"
-values_filename = "pong_values.dat"
+from checkpoint import Checkpointer, load_array
+from actor_critic import ActorCritic
+from parallel_learn import SharedTables, train_parallel
+from planning import PrioritizedSweeping
+from policy_artifact import export_policy
+
+# the old JSON dumps are read once if there is no binary checkpoint yet
+legacy_policy_filename = "pong_policy.dat"
+legacy_values_filename = "pong_values.dat"
+policy_filename = "pong_policy.npy"
+values_filename = "pong_values.npy"
+compiled_policy_filename = "pong_policy.bin" # played by td_pong_play
+checkpoint_every = 10000 # iterations
+checkpoint_seconds = 30.0 # and at least this often
 
 alpha = 0.1 # values / critic learning parameter
 beta = 0.01  # actor learning parameter
 gamma = 0.5  # error signal: future states parameter
+trace_decay = 0.0 # lambda of TD(lambda) for critic and actor, 0: one-step TD
+planning_steps = 0 # simulated critic backups per learning step (prioritized sweeping), 0: off
 
 world_dim = env.getWorldDim()
 num_possible_moves = env.getActionDim()
 
-state = env.getState()
-
-iterations = int(sys.argv[1])
-
-pol_file = None
-val_file = None
-
-if os.path.exists(policy_filename):
-	pol_file = open(policy_filename, 'r+')
-	policy = numpy.array(json.loads(pol_file.read()))
-	pol_file.close()
-else:
-	#create random policy
-	policy = numpy.random.rand(world_dim[1], world_dim[0], num_possible_moves)
-
-pol_file = open(policy_filename, 'w+')
-
-if os.path.exists(values_filename):
-	val_file = open(values_filename, 'r+')
-	values = numpy.array(json.loads(val_file.read()))
-	val_file.close()
-else:
-	#create empty value funcion
-	values = numpy.zeros([world_dim[1], world_dim[0]])
-
-
-
-val_file = open(values_filename, 'w+')
-
-def cum_softmax_direction_prop(state):
-	# calculates the cumulated softmax propability for every possible action
-	current_policy = policy[state[1], state[0], :]  # prop in this agent_pos
-	#print current_policy
-	softmax_prop = numpy.exp(current_policy)
-	#print numpy.sum(softmax_prop)
-	softmax_prop = softmax_prop / numpy.sum(softmax_prop)  # softmax: (e^prop) / (sum(e^prop))
-	cum_softmax_prop = numpy.cumsum(softmax_prop)  # cumulating
-	return (cum_softmax_prop)
-
-
-def pick_action(state):
-    cum_softmax_prop = cum_softmax_direction_prop(state)
-    r = numpy.random.rand()
-    for i in range(len(cum_softmax_prop)):
-        if cum_softmax_prop[i] > r:
-            return i
-
-
-def critic(state, last_state, reward):
-    error = reward - values[last_state[1], last_state[0]] + gamma * values[state[1], state[0]]
-    return (error)
-
-
-i = 0
-while i < iterations:
-	#time.sleep(0.9)
-	i += 1
-	sys.stdout.write(str(float(i)/iterations) + "\r")
-	direction = pick_action(state)
-		
-	last_state = state[:][:] 
-	
-	outcome = 0	
-	state, outcome = env.move(direction)
-		
-	error = critic(state, last_state, outcome)
-
-
-	if outcome != 0 or state != last_state:
-	#	print "error ", error
-		values[last_state[1], last_state[0]] += alpha * error
-	
-		policy[last_state[1], last_state[0], direction] += beta * error
-
-#	if outcome != 0:
-#		for row in values:
-#			print numpy.array(row, dtype=int) 
-	
-
-
-	pol_file.seek(0)
-	val_file.seek(0)
-	pol_file.write(json.dumps(policy.tolist()))
-	val_file.write(json.dumps(values.tolist()))
-	pol_file.truncate()
-	val_file.truncate()
-
-
-print values
-pol_file.close()
-val_file.close()
+# the workers of train_parallel import this module again under spawn or
+# forkserver, so training only runs when it is executed as a script
+if __name__ == "__main__":
+	iterations = int(sys.argv[1])
+	num_worlds = int(sys.argv[2]) if len(sys.argv) > 2 else 1 # parallel episodes
+	num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else 1 # training processes
+
+	policy = load_array(policy_filename, legacy_policy_filename)
+	if policy is None:
+		#create random policy
+		policy = numpy.random.rand(world_dim[1], world_dim[0], num_possible_moves)
+
+	values = load_array(values_filename, legacy_values_filename)
+	if values is None:
+		#create empty value funcion
+		values = numpy.zeros([world_dim[1], world_dim[0]])
+
+	if num_workers > 1:
+		# the tables move to shared memory, the workers update them lock-free
+		tables = SharedTables(policy, values)
+		policy, values = tables.policy, tables.values
+
+	# written by a background thread, atomically replacing the files
+	checkpoints = Checkpointer({'policy': policy, 'values': values},
+	                           {'policy': policy_filename, 'values': values_filename},
+	                           every=checkpoint_every, seconds=checkpoint_seconds)
+
+	if num_workers > 1:
+		train_parallel(tables, iterations, num_workers, num_worlds,
+		               dict(alpha=alpha, beta=beta, gamma=gamma, trace_decay=trace_decay),
+		               checkpoints, planning_steps)
+	else:
+		# transitions of all worlds are learned from as one batch per iteration
+		learner = ActorCritic(policy, values, alpha, beta, gamma, trace_decay=trace_decay)
+		planner = PrioritizedSweeping(learner) if planning_steps else None
+		worlds = env.GridWorld(num_worlds)
+		states = worlds.getState().copy()
+		last_states = numpy.empty_like(states)
+
+		i = 0
+		while i < iterations:
+			#time.sleep(0.9)
+			i += 1
+			sys.stdout.write(str(float(i)/iterations) + "\r")
+			directions = learner.pick_actions(states)
+
+			last_states[:] = states
+
+			new_states, outcomes = worlds.move(directions)
+			states[:] = new_states
+
+			errors = learner.update(last_states, directions, outcomes, states)
+			if planner is not None:
+				planner.observe(last_states, directions, outcomes, states, errors)
+				planner.plan(planning_steps)
+
+			checkpoints.maybe_save(i)
+
+
+	checkpoints.close()
+	export_policy(policy, compiled_policy_filename)
+	print values
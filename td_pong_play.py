@@ -1,65 +1,66 @@
 import random
 import numpy
 import sys
-import time
 import os
-import json
 from pong_environment_play import PongGame
-
-policy_filename = "pong_policy.dat"
-values_filename = "pong_values.dat"
+from checkpoint import load_array
+from tables import new_table
+from actor_critic import SoftmaxSampler
+from policy_artifact import CompiledPolicy
+
+# written by td_pong_learn; the old JSON dumps are still read if present
+legacy_policy_filename = "pong_policy.dat"
+legacy_values_filename = "pong_values.dat"
+policy_filename = "pong_policy.npy"
+values_filename = "pong_values.npy"
+compiled_policy_filename = "pong_policy.bin"
 
 alpha = 0.1 # values / critic learning parameter
 beta = 0.1  # actor learning parameter
 gamma = 0.9  # error signal: future states parameter
+# storage of new tables: "float64", "float32", "float16" or "sparse" (only
+# visited cells take memory, for high bin counts)
+table_kind = "float64"
 
-env = PongGame(["human", "computer"], bins=12)
+env = PongGame(["human", "computer"], bins=12, waitable=True) # see wait_for_frame below
 
 world_dim = env.getWorldDim()
 num_possible_moves = env.getActionDim()
 
 state = env.getState(1)
 
-pol_file = None
-val_file = None
-
-if os.path.exists(policy_filename):
-    pol_file = open(policy_filename, 'r+')
-    policy = numpy.array(json.loads(pol_file.read()))
-    pol_file.close()
-else:
+# mapped copy-on-write: pages are read as states are visited
+policy = load_array(policy_filename, legacy_policy_filename, mmap_mode='c')
+if policy is None:
     #create random policy
-    policy = numpy.random.rand(world_dim[1], world_dim[0], num_possible_moves)
-
-#pol_file = open(policy_filename, 'w+')
+    policy = new_table([world_dim[1], world_dim[0], num_possible_moves], table_kind,
+                       numpy.random.rand)
 
-if os.path.exists(values_filename):
-    val_file = open(values_filename, 'r+')
-    values = numpy.array(json.loads(val_file.read()))
-    val_file.close()
-else:
+values = load_array(values_filename, legacy_values_filename, mmap_mode='c')
+if values is None:
     #create empty value funcion
-    values = numpy.zeros([world_dim[1], world_dim[0]])
+    values = new_table([world_dim[1], world_dim[0]], table_kind)
 
 
+# cached cumulated softmax of every state, refreshed when a cell is learned
+sampler = SoftmaxSampler(policy)
 
-#val_file = open(values_filename, 'w+')
 
-def cum_softmax_direction_prop(state):
-    # calculates the cumulated softmax propability for every possible action
-    current_policy = policy[state[1], state[0], :]  # prop in this agent_pos
-    softmax_prop = numpy.exp(current_policy)
-    softmax_prop = softmax_prop / numpy.sum(softmax_prop)  # softmax: (e^prop) / (sum(e^prop))
-    cum_softmax_prop = numpy.cumsum(softmax_prop)  # cumulating
-    return (cum_softmax_prop)
+# exported by td_pong_learn: states not learned in this session are played
+# straight from its table.  It is only used if it was compiled from the
+# policy loaded above; after an interrupted run the checkpoint is newer
+compiled = None
+if os.path.exists(compiled_policy_filename):
+    compiled = CompiledPolicy(compiled_policy_filename)
+    if not compiled.compiled_from(policy):
+        compiled = None
+learned = set()
 
 
 def pick_action(state):
-    cum_softmax_prop = cum_softmax_direction_prop(state)
-    r = numpy.random.rand()
-    for i in range(len(cum_softmax_prop)):
-        if cum_softmax_prop[i] > r:
-            return i
+    if compiled is not None and (state[1], state[0]) not in learned:
+        return compiled.sample(state)
+    return int(sampler.sample(state)[0])
 
 
 def critic(state, last_state, reward):
@@ -78,7 +79,10 @@ while True:
     outcome = 0
     last_state, outcome = env.move(direction, 1)
 
-    time.sleep(0.05)
+    # block until the game has drawn the frame that used this action, so
+    # the agent answers every frame instead of sleeping a fixed 50 ms
+    if not env.wait_for_frame(1.0) and not env.is_alive():
+        break
     state = env.getState(1)
 
     if outcome != 0 or state != last_state:
@@ -87,6 +91,8 @@ while True:
         values[last_state[1], last_state[0]] += alpha * error
 
         policy[last_state[1], last_state[0], direction] += beta * error
+        sampler.refresh(last_state[1], last_state[0])
+        learned.add((last_state[1], last_state[0]))
 
     #	if outcome != 0:
     #		for row in values:
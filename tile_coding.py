@@ -0,0 +1,58 @@
+import numpy
+
+
+class TileCoder(object):
+    """Maps continuous observations to the active tiles of several tilings.
+
+    Each of the tilings is a regular grid over [low, high] with tiles[d]
+    tiles along dimension d, shifted by a fraction of a tile (asymmetric
+    offsets, 1, 3, 5, ... tile widths / tilings along the dimensions).
+    Every observation activates exactly one tile per tiling, so a linear
+    learner needs a table of num_features entries instead of bins ** k.
+
+    :param low: lower bound of every observation dimension
+    :param high: upper bound of every observation dimension
+    :param tiles: number of tiles per dimension (int or one per dimension)
+    :param tilings: number of offset tilings
+    """
+
+    def __init__(self, low, high, tiles, tilings=8):
+        self.low = numpy.asarray(low, dtype=float)
+        self.high = numpy.asarray(high, dtype=float)
+        dims = len(self.low)
+        self.tiles = numpy.broadcast_to(numpy.asarray(tiles, dtype=int), (dims,)).copy()
+        self.tilings = tilings
+
+        # observation -> tile coordinates is one multiply and one add
+        self.scale = self.tiles / (self.high - self.low)
+        # the offsets push coordinates up to one tile past the grid, so each
+        # tiling has tiles + 1 tiles per dimension
+        self.offsets = (numpy.arange(tilings)[:, None] * (2 * numpy.arange(dims) + 1)
+                        % tilings) / float(tilings)
+        self.shifted_low = self.low * self.scale - self.offsets
+        self.max_coordinate = self.tiles
+        self.strides = numpy.cumprod(numpy.concatenate(([1], self.tiles[:-1] + 1)))
+        self.tiles_per_tiling = int(numpy.prod(self.tiles + 1))
+        self.tiling_base = numpy.arange(tilings) * self.tiles_per_tiling
+        self.num_features = tilings * self.tiles_per_tiling
+
+    def encode(self, observations):
+        """Active tile indices of one observation (k,) or a batch (N, k).
+
+        :returns: (tilings,) or (N, tilings) int array of feature indices
+        """
+        observations = numpy.asarray(observations, dtype=float)
+        batch = observations.reshape(-1, 1, len(self.low))
+        coordinates = numpy.floor(batch * self.scale - self.shifted_low).astype(int)
+        # observations outside [low, high] fall in the border tiles
+        numpy.clip(coordinates, 0, self.max_coordinate, out=coordinates)
+        active = coordinates.dot(self.strides) + self.tiling_base
+        return active.reshape(observations.shape[:-1] + (self.tilings,))
+
+    def features(self, observations):
+        """Dense 0/1 feature vectors for the observations (mostly for debugging)."""
+        active = self.encode(observations)
+        out = numpy.zeros(active.shape[:-1] + (self.num_features,), dtype=numpy.uint8)
+        flat = out.reshape(-1, self.num_features)
+        flat[numpy.arange(len(flat))[:, None], active.reshape(-1, self.tilings)] = 1
+        return out
@@ -0,0 +1,138 @@
+import os
+import threading
+
+import numpy
+
+from pong_shared import STATE_FIELDS, BALL_Y, PADDLE0_Y
+
+MAGIC = b"PONGLOG1"
+HEADER_DTYPE = numpy.dtype([('magic', 'S8'), ('record_size', '<u4'), ('pad', '<u4'),
+                            ('count', '<u8')])
+# one step of one player: the state and reward returned by move/step, the
+# pong direction they are the effect of and whether the player missed.  A
+# lockstep step() applies its own direction before returning; move() hands
+# its direction to the game and returns at once, so its record holds the
+# direction of the previous move (0 for the first)
+RECORD_DTYPE = numpy.dtype([('state', '<f4', (len(STATE_FIELDS),)), ('action', '<f4'),
+                            ('reward', '<f4'), ('player', 'u1'), ('done', 'u1'),
+                            ('pad', 'u1', (2,))])
+GROW_RECORDS = 1 << 16
+
+
+class TrajectoryWriter(object):
+    """Append-only log of fixed-width step records in a memory-mapped file.
+
+    The record count in the header is updated after every append, so a
+    reader can open the file while it is still being written.  Appending
+    to an existing log continues after its last record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                header = numpy.zeros(1, dtype=HEADER_DTYPE)
+                header['magic'] = MAGIC
+                header['record_size'] = RECORD_DTYPE.itemsize
+                f.write(header.tobytes())
+        self.header = numpy.memmap(path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        check_header(self.header, path)
+        self.count = int(self.header['count'][0])
+        self.records = None
+        self._map(self.count + GROW_RECORDS)
+
+    def _map(self, capacity):
+        if self.records is not None:
+            self.records.flush()
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_DTYPE.itemsize + capacity * RECORD_DTYPE.itemsize)
+        self.records = numpy.memmap(self.path, dtype=RECORD_DTYPE, mode='r+',
+                                    offset=HEADER_DTYPE.itemsize, shape=(capacity,))
+
+    def append(self, state, action, reward, player, done):
+        self.lock.acquire()
+        if self.count == len(self.records):
+            self._map(self.count + GROW_RECORDS)
+        record = self.records[self.count]
+        record['state'] = state
+        record['action'] = action
+        record['reward'] = reward
+        record['player'] = player
+        record['done'] = done
+        self.count += 1
+        self.header['count'] = self.count
+        self.lock.release()
+
+    def close(self):
+        # flush and cut the file back to the records actually written
+        self.records.flush()
+        self.header.flush()
+        self.records = None
+        self.header = None
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER_DTYPE.itemsize + self.count * RECORD_DTYPE.itemsize)
+
+
+class TrajectoryReader(object):
+    """Read-only, memory-mapped view of a trajectory log.
+
+    Index it like an array of RECORD_DTYPE (single records or slices are
+    read straight from the page cache) or walk it with chunks().
+    """
+
+    def __init__(self, path):
+        header = numpy.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        check_header(header, path)
+        self.count = int(header['count'][0])
+        if self.count:
+            self.records = numpy.memmap(path, dtype=RECORD_DTYPE, mode='r',
+                                        offset=HEADER_DTYPE.itemsize, shape=(self.count,))
+        else:
+            self.records = numpy.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def chunks(self, size=GROW_RECORDS):
+        for start in range(0, self.count, size):
+            yield self.records[start:start + size]
+
+    def transitions(self, player, bins, size=GROW_RECORDS, height=480):
+        """Yield (state, action, reward, next_state, done) arrays per chunk.
+
+        States are binned [ball_y, paddle] like PongGame.getState, actions
+        are agent action indices (0 stay, 1 down, 2 up).  The reward and
+        next state are the ones that followed the action (returned by the
+        same lockstep step, or by the next move).
+        """
+        previous = None
+        for chunk in self.chunks(size):
+            steps = chunk[chunk['player'] == player]
+            if len(steps) == 0:
+                continue
+            states = bin_states(steps['state'], player, bins, height)
+            actions = numpy.where(steps['action'] < 0, 2, steps['action']).astype(int)
+            if previous is None:
+                # the first step has no state before it
+                last_states = states[:-1]
+                previous = states[-1:]
+                steps, states, actions = steps[1:], states[1:], actions[1:]
+            else:
+                last_states = numpy.vstack((previous, states[:-1]))
+                previous = states[-1:]
+            yield last_states, actions, steps['reward'], states, steps['done'].astype(bool)
+
+
+def bin_states(states, player, bins, height=480):
+    # raw snapshot values -> [ball_y, paddle] bins as in PongGame.update_state
+    columns = states[:, [BALL_Y, PADDLE0_Y + player]]
+    return numpy.minimum(bins - 1, (columns / (float(height) / bins)).astype(int))
+
+
+def check_header(header, path):
+    if header['magic'][0] != MAGIC or header['record_size'][0] != RECORD_DTYPE.itemsize:
+        raise ValueError("%s is not a trajectory log" % path)
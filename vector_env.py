@@ -0,0 +1,114 @@
+import numpy
+
+
+class VectorEnv(object):
+    """Gym-style batch of K environments driven with one call.
+
+    step() takes one agent action index (0 stay, 1 down, 2 up) per
+    environment and returns stacked [ball_y, paddle] observations, rewards
+    and done flags.  An environment whose episode ended is reset before
+    step() returns, so the observation in that row already belongs to the
+    next episode.  The returned arrays are reused by the next call.
+
+    :param envs: list of PongGameEnv / GridWorldEnv (anything with
+                 submit, collect and reset)
+    """
+
+    def __init__(self, envs):
+        self.envs = envs
+        self.num_envs = len(envs)
+        self.observations = numpy.zeros((self.num_envs, 2), dtype=int)
+        self.rewards = numpy.zeros(self.num_envs)
+        self.dones = numpy.zeros(self.num_envs, dtype=bool)
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            self.observations[i] = env.reset()
+        return self.observations
+
+    def step(self, actions):
+        return self.step_members(range(self.num_envs), actions, self.observations,
+                                 self.rewards, self.dones)
+
+    def step_members(self, indices, actions, observations, rewards, dones):
+        # step only envs[indices], writing row j of the outputs for indices[j]
+        members = [self.envs[i] for i in indices]
+        # submit everything first, so lockstep games simulate in parallel
+        for env, action in zip(members, actions):
+            env.submit(action)
+        for j, env in enumerate(members):
+            state, reward, done = env.collect()
+            if done:
+                state = env.reset()
+            observations[j] = state
+            rewards[j] = reward
+            dones[j] = done
+        return observations, rewards, dones
+
+
+class PongGameEnv(object):
+    """One player of a running PongGame (or PongProcess) as a VectorEnv member.
+
+    An episode ends when the player misses the ball; the game serves again
+    by itself, so reset() only returns the current state.  With a lockstep
+    game every step is exactly one frame, otherwise it is whatever the game
+    simulated in the meantime.  A lockstep game with two computer players
+    needs both players stepped, e.g. as two members of the same VectorEnv.
+    """
+
+    def __init__(self, game, player):
+        self.game = game
+        self.player = player
+        self.world_dim = game.getWorldDim()
+        self.misses = game.misses[player]
+
+    def reset(self):
+        return self.game.getState(self.player)
+
+    def submit(self, action):
+        self.game.submit(action, self.player)
+
+    def collect(self):
+        state, reward = self.game.collect(self.player)
+        misses = self.game.misses[self.player]
+        done = misses != self.misses
+        self.misses = misses
+        return state, reward, done
+
+
+class GridWorldEnv(object):
+    """One world of a pong_environment_training.GridWorld as a VectorEnv member.
+
+    An episode ends when the paddle catches the ball (the +600 step); the
+    ball is then beamed to a new random cell at once instead of two moves
+    later.  Members built on the same GridWorld (one per row) share its
+    move: the first collect() after a round of submits moves every world
+    at once, a world nobody submitted for stays put.  Like the players of
+    a lockstep game they should be stepped together.
+
+    :param world: a pong_environment_training.GridWorld
+    :param row: index of the world in it
+    """
+
+    def __init__(self, world, row=0):
+        self.world = world
+        self.row = row
+        self.world_dim = world.getWorldDim()
+
+    def reset(self):
+        self.world.reset([self.row])
+        return tuple(self.world.states[self.row])
+
+    def submit(self, action):
+        world = self.world
+        world.directions[self.row] = action
+        world.pending = True
+
+    def collect(self):
+        world = self.world
+        if world.pending:
+            world.move(world.directions)
+            world.directions.fill(0)
+            world.pending = False
+        outcome = int(world.outcomes[self.row])
+        return tuple(world.states[self.row]), outcome, outcome > 0